@@ -0,0 +1,134 @@
+import argparse
+import csv
+import datetime
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import openpyxl
+
+from main import StudentExporter, create_students_table, ensure_schema, open_connection, rank_all_students
+
+FIRST_NAMES = [
+    "علی", "محمد", "حسین", "رضا", "مهدی", "امیر", "حسن", "مصطفی", "سعید", "حمید",
+    "جواد", "مجید", "سجاد", "امین", "پویا", "آرش", "بهرام", "کیان", "نیما", "سینا",
+    "فاطمه", "زهرا", "مریم", "سارا", "نرگس", "الهام", "مهسا", "نگار", "پریسا", "سمیرا",
+    "لیلا", "شیوا", "آزاده", "ریحانه", "کوثر", "هانیه", "یاسمن", "ترانه", "رها", "نازنین",
+]
+LAST_NAMES = [
+    "محمدی", "حسینی", "احمدی", "رضایی", "موسوی", "کریمی", "جعفری", "هاشمی", "صادقی", "رحیمی",
+    "قاسمی", "عباسی", "نوری", "کاظمی", "مرادی", "اکبری", "حیدری", "طاهری", "یزدانی", "شریفی",
+    "سلطانی", "فرهادی", "نجفی", "میرزایی", "زارعی", "باقری", "ابراهیمی", "ملکی", "سبحانی", "توکلی",
+]
+# نمره‌ها با گام ۰.۲۵ تولید می‌شوند تا معدل‌های مساوی زیاد باشند؛ بخشی از نمره‌ها عمدا خالی است
+MISSING_GRADE_RATE = 0.03
+ROSTER_COLUMNS = ["نام", "نام خانوادگی", "شماره دانشجویی", "نمره میانترم", "نمره پایان‌ترم"]
+FIRST_STUDENT_ID = 40000000
+REGISTRATION_DAYS = 4 * 365
+REGISTRATION_END = datetime.datetime(2025, 9, 1)
+
+
+def grade(rng, base):
+    if rng.random() < MISSING_GRADE_RATE:
+        return None
+    return min(80, max(0, round(rng.gauss(base, 10)))) / 4
+
+
+def student_rows(count, seed):
+    # خروجی برای یک seed و count همیشه یکسان است
+    rng = random.Random(seed)
+    for i in range(count):
+        base = rng.gauss(56, 12)
+        midterm = grade(rng, base)
+        final = grade(rng, base)
+        average = midterm * 0.3 + final * 0.7 if midterm is not None and final is not None else None
+        registered = REGISTRATION_END - datetime.timedelta(seconds=rng.randrange(REGISTRATION_DAYS * 86400))
+        yield (rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), str(FIRST_STUDENT_ID + i),
+               midterm, final, average, registered.strftime("%Y-%m-%d %H:%M:%S"))
+
+
+def create_database(path, count, seed):
+    # ردیف‌ها در جدول اصلی برنامه و پیش از ساخت ایندکس‌ها و تریگرها درج می‌شوند؛ ensure_schema سپس جدول‌های آماری و جستجو را یک‌جا می‌سازد
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    create_students_table(conn.cursor())
+    with conn:
+        conn.executemany(
+            "INSERT INTO students (first_name, last_name, student_id, midterm, final, average, registration_date) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            student_rows(count, seed)
+        )
+    conn.close()
+    conn = open_connection(path)
+    try:
+        ensure_schema(conn)
+        rank_all_students(conn)
+        conn.commit()
+        conn.execute("PRAGMA optimize")
+    finally:
+        conn.close()
+
+
+def write_roster(path, count, seed):
+    rows = ((first_name, last_name, student_id, midterm, final)
+            for first_name, last_name, student_id, midterm, final, _, _ in student_rows(count, seed))
+    if path.lower().endswith(".csv"):
+        with open(path, "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(ROSTER_COLUMNS)
+            writer.writerows(rows)
+        return
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("دانشجویان")
+    sheet.append(ROSTER_COLUMNS)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(path)
+
+
+def database_path(data_dir, count, seed):
+    return os.path.join(data_dir, f"students_{count}_seed{seed}.db")
+
+
+def roster_path(data_dir, count, seed):
+    # یک برگه اکسل بیش از MAX_SHEET_ROWS ردیف جا ندارد؛ فهرست‌های بزرگ‌تر CSV نوشته می‌شوند
+    extension = "xlsx" if count <= StudentExporter.MAX_SHEET_ROWS else "csv"
+    return os.path.join(data_dir, f"roster_{count}_seed{seed}.{extension}")
+
+
+def ensure_data(data_dir, count, seed, log=print):
+    # فایل‌های ساخته‌شده بازاستفاده می‌شوند؛ هر فایل ابتدا با نام موقت ساخته می‌شود تا فایل نیمه‌کاره باقی نماند
+    os.makedirs(data_dir, exist_ok=True)
+    paths = (database_path(data_dir, count, seed), roster_path(data_dir, count, seed))
+    for path, build in zip(paths, (create_database, write_roster)):
+        if os.path.exists(path):
+            continue
+        started = time.perf_counter()
+        stem, extension = os.path.splitext(path)
+        temp_path = f"{stem}.tmp{extension}"
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        build(temp_path, count, seed)
+        os.replace(temp_path, path)
+        log(f"{os.path.basename(path)}: {time.perf_counter() - started:.1f}s")
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="تولید پایگاه داده و فهرست اکسل دانشجویان برای بنچمارک")
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--data-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+    args = parser.parse_args()
+
+    for size in [int(value) for value in args.sizes.split(",")]:
+        ensure_data(args.data_dir, size, args.seed)
+
+
+if __name__ == "__main__":
+    main()
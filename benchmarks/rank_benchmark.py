@@ -0,0 +1,59 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication
+
+app = QApplication.instance() or QApplication(sys.argv)
+
+from main import RANK_POLICIES, create_students_table, ensure_schema, open_connection, rank_all_students
+
+
+def create_students(conn, count, seed):
+    rng = random.Random(seed)
+    create_students_table(conn.cursor())
+    # معدل‌ها با گام ۰.۲۵ تولید می‌شوند تا تعداد زیادی رتبه مساوی داشته باشیم
+    rows = (
+        (f"نام{i}", f"خانوادگی{i}", str(40000000 + i), None, None,
+         None if rng.random() < 0.02 else rng.randint(0, 80) / 4)
+        for i in range(count)
+    )
+    with conn:
+        conn.executemany(
+            "INSERT INTO students (first_name, last_name, student_id, midterm, final, average) VALUES (?, ?, ?, ?, ?, ?)",
+            rows
+        )
+    # رتبه‌بندی روی همان طرح برنامه با ایندکس‌ها و تریگرهایش اندازه‌گیری می‌شود
+    ensure_schema(conn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="بنچمارک رتبه‌بندی دانشجویان")
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'policy':>12} {'seconds':>10} {'us/row':>10}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in [int(value) for value in args.sizes.split(",")]:
+            db_path = os.path.join(workdir, f"students_{size}.db")
+            conn = open_connection(db_path)
+            create_students(conn, size, args.seed)
+            for policy in RANK_POLICIES:
+                conn.execute("UPDATE students SET rank = NULL")
+                conn.commit()
+                started = time.perf_counter()
+                rank_all_students(conn, policy)
+                elapsed = time.perf_counter() - started
+                print(f"{size:>10} {policy:>12} {elapsed:>10.3f} {elapsed / size * 1e6:>10.2f}")
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # ماژول resource فقط در یونیکس وجود دارد؛ در ویندوز بیشینه حافظه پردازه اندازه‌گیری نمی‌شود و ستون RSS خالی می‌ماند
+    resource = None
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtCore import QEvent, QEventLoop, QThreadPool, QT_VERSION_STR
+from PyQt5.QtWidgets import QApplication, QDialog, QFileDialog, QMessageBox
+
+from generate_data import ensure_data
+from main import DATABASE_PATH, StudentManagementSystem
+
+
+class Bench:
+    # هر عملیات در یک پوشه کاری جدا و با پنجره واقعی برنامه اجرا می‌شود؛ پنجره‌های پیام و انتخاب فایل پاسخ ثابت می‌گیرند
+    def __init__(self, database, roster):
+        self.database = database
+        self.roster = roster
+        self.workdir = tempfile.mkdtemp(prefix="students_bench_")
+        self.open_path = ""
+        self.save_path = ""
+        self.errors = []
+        self.window = None
+
+    def open_window(self, empty=False):
+        if self.window is not None:
+            # سیگنال‌های صف‌شده کارهای پس‌زمینه پنجره قبلی (مثلاً نگهداری عکس‌ها) باید پیش از حذف آن تحویل شوند
+            self.wait_for_jobs()
+            self.window.close()
+            self.window.deleteLater()
+            QApplication.sendPostedEvents(None, QEvent.DeferredDelete)
+            self.window = None
+            shutil.rmtree(self.workdir)
+            os.makedirs(self.workdir)
+        if not empty:
+            shutil.copyfile(self.database, os.path.join(self.workdir, DATABASE_PATH))
+        os.chdir(self.workdir)
+        self.window = StudentManagementSystem()
+        return self.window
+
+    def wait_for_jobs(self):
+        QThreadPool.globalInstance().waitForDone()
+        QApplication.processEvents()
+
+    def close(self):
+        if self.window is not None:
+            self.wait_for_jobs()
+            self.window.close()
+        os.chdir(BENCHMARK_DIR)
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def install_dialog_answers(bench):
+    def message(kind):
+        def answer(parent, title, text, *args, **kwargs):
+            if kind == "critical":
+                bench.errors.append(f"{title}: {text}")
+            return QMessageBox.No if kind == "question" else QMessageBox.Ok
+        return answer
+    for kind in ("information", "warning", "critical", "question"):
+        setattr(QMessageBox, kind, message(kind))
+    QFileDialog.getOpenFileName = lambda *args, **kwargs: (bench.open_path, "")
+    QFileDialog.getSaveFileName = lambda *args, **kwargs: (bench.save_path, "")
+    QDialog.exec_ = lambda dialog: QDialog.Accepted
+
+
+# هر عملیات پیش از زمان‌گیری آماده می‌شود و تابعی برمی‌گرداند که فقط خود عملیات را اجرا می‌کند
+def bench_load_students(bench):
+    return bench.window.load_students
+
+
+def bench_advanced_search(bench):
+    window = bench.window
+    window.search_name_edit.setText("علی")
+    window.search_min_avg_edit.setText("15")
+
+    def run():
+        loop = QEventLoop()
+        window.search_worker.search_finished.connect(loop.quit)
+        window.search_worker.search_failed.connect(loop.quit)
+        window.advanced_search()
+        loop.exec_()
+        window.search_worker.search_finished.disconnect(loop.quit)
+        window.search_worker.search_failed.disconnect(loop.quit)
+    return run
+
+
+def bench_rank_students(bench):
+    return bench.window.rank_students
+
+
+def bench_update_dashboard(bench):
+    return bench.window.update_dashboard
+
+
+def bench_import_from_excel(bench):
+    # هر تکرار در یک پایگاه داده خالی وارد می‌شود
+    bench.open_window(empty=True)
+    bench.open_path = bench.roster
+
+    def run():
+        bench.window.import_from_excel()
+        bench.wait_for_jobs()
+    return run
+
+
+def bench_export_to_excel(bench):
+    bench.save_path = os.path.join(bench.workdir, "export.xlsx")
+
+    def run():
+        bench.window.export_to_excel()
+        bench.wait_for_jobs()
+    return run
+
+
+def bench_backup_database(bench):
+    bench.save_path = os.path.join(bench.workdir, "backup.db")
+    if os.path.exists(bench.save_path):
+        os.remove(bench.save_path)
+
+    def run():
+        bench.window.backup_database()
+        bench.wait_for_jobs()
+    return run
+
+
+def bench_show_statistics_chart(bench):
+    # نمودار رسم‌شده کش می‌شود؛ برای اندازه‌گیری رسم، کش پیش از هر اجرا خالی می‌شود
+    bench.window.figures.items.clear()
+    return bench.window.show_statistics_chart
+
+
+OPERATIONS = {
+    "load_students": bench_load_students,
+    "advanced_search": bench_advanced_search,
+    "rank_students": bench_rank_students,
+    "update_dashboard": bench_update_dashboard,
+    "import_from_excel": bench_import_from_excel,
+    "export_to_excel": bench_export_to_excel,
+    "backup_database": bench_backup_database,
+    "show_statistics_chart": bench_show_statistics_chart,
+}
+
+
+def max_rss_bytes():
+    # ru_maxrss در لینوکس کیلوبایت و در macOS بایت است
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == "darwin" else usage * 1024
+
+
+def run_worker(operation, database, roster, repeat):
+    app = QApplication.instance() or QApplication(sys.argv)
+    prepare = OPERATIONS[operation]
+    bench = Bench(database, roster)
+    install_dialog_answers(bench)
+    try:
+        bench.open_window()
+        baseline_rss = max_rss_bytes()
+        seconds = []
+        # اجرای آخر با tracemalloc است و در زمان‌ها حساب نمی‌شود
+        for i in range(repeat + 1):
+            run = prepare(bench)
+            if i == repeat:
+                tracemalloc.start()
+                run()
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            else:
+                started = time.perf_counter()
+                run()
+                seconds.append(time.perf_counter() - started)
+        return {
+            "operation": operation,
+            "seconds": seconds,
+            "median_seconds": statistics.median(seconds),
+            "min_seconds": min(seconds),
+            "tracemalloc_peak_bytes": peak,
+            "baseline_rss_bytes": baseline_rss,
+            "max_rss_bytes": max_rss_bytes(),
+            "errors": bench.errors,
+        }
+    finally:
+        bench.close()
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=BENCHMARK_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(args):
+    sizes = [int(value) for value in args.sizes.split(",")]
+    operations = args.operations.split(",") if args.operations else list(OPERATIONS)
+    results = {
+        "commit": git_commit(),
+        "created": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "qt": QT_VERSION_STR,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "results": [],
+    }
+    print(f"{'rows':>10} {'operation':>22} {'median ms':>10} {'min ms':>10} {'py peak MB':>11} {'rss MB':>8}")
+    for size in sizes:
+        database, roster = ensure_data(args.data_dir, size, args.seed)
+        for operation in operations:
+            # هر عملیات در پردازه جداگانه اجرا می‌شود تا بیشینه حافظه مستقل اندازه‌گیری شود
+            completed = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--worker", operation,
+                 "--database", database, "--roster", roster, "--repeat", str(args.repeat)],
+                capture_output=True, text=True
+            )
+            if completed.returncode != 0:
+                print(f"{size:>10} {operation:>22} failed (exit code {completed.returncode}):\n{completed.stderr}")
+                results["results"].append({"rows": size, "operation": operation, "failed": completed.stderr[-2000:]})
+                continue
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            result["rows"] = size
+            results["results"].append(result)
+            rss = "-" if result["max_rss_bytes"] is None else f"{result['max_rss_bytes'] / 1048576:.0f}"
+            print(f"{size:>10} {operation:>22} {result['median_seconds'] * 1000:>10.2f} {result['min_seconds'] * 1000:>10.2f} "
+                  f"{result['tracemalloc_peak_bytes'] / 1048576:>11.1f} {rss:>8}")
+            for error in result["errors"]:
+                print(f"{'':>10} {'':>22} {error}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\n{args.output}")
+    if args.compare:
+        compare(args.compare, results)
+    # عملیاتی که از کار افتاده یا پیام خطا نشان داده، اجرای بنچمارک را ناموفق می‌کند
+    return [result for result in results["results"] if "failed" in result or result["errors"]]
+
+
+def compare(baseline_path, results):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    previous = {(result["rows"], result["operation"]): result for result in baseline["results"] if "failed" not in result}
+    print(f"\nمقایسه با {baseline.get('commit') or baseline_path}")
+    print(f"{'rows':>10} {'operation':>22} {'before ms':>10} {'after ms':>10} {'ratio':>8}")
+    for result in results["results"]:
+        before = previous.get((result["rows"], result["operation"]))
+        if before is None or "failed" in result:
+            continue
+        ratio = result["median_seconds"] / before["median_seconds"] if before["median_seconds"] else float("inf")
+        print(f"{result['rows']:>10} {result['operation']:>22} {before['median_seconds'] * 1000:>10.2f} "
+              f"{result['median_seconds'] * 1000:>10.2f} {ratio:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="بنچمارک عملیات اصلی برنامه مدیریت دانشجویان")
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--operations", default="", help="فهرست عملیات جداشده با کاما؛ پیش‌فرض همه عملیات")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--data-dir", default=os.path.join(BENCHMARK_DIR, "data"))
+    parser.add_argument("--output", default=os.path.join(
+        BENCHMARK_DIR, "results", f"benchmark_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json"))
+    parser.add_argument("--compare", help="فایل JSON یک اجرای قبلی برای مقایسه")
+    parser.add_argument("--worker", choices=list(OPERATIONS), help=argparse.SUPPRESS)
+    parser.add_argument("--database", help=argparse.SUPPRESS)
+    parser.add_argument("--roster", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.database, args.roster, args.repeat)))
+    else:
+        failures = run_suite(args)
+        if failures:
+            print(f"\n{len(failures)} عملیات ناموفق بود", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
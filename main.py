@@ -1,30 +1,2945 @@
 import sys
 import sqlite3
+import csv
 import hashlib
+import json
+import base64
+import html
+import zlib
+import bisect
+import math
+import re
+import functools
 import os
+import shutil
 import datetime
+import logging
+import time
+import threading
+import queue
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from collections import OrderedDict, deque
+from itertools import islice
+from urllib.request import pathname2url
+import numpy as np
 import pandas as pd
+import openpyxl
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
-                             QLabel, QLineEdit, QPushButton, QTableWidget, QTableWidgetItem,
+                             QLabel, QLineEdit, QPushButton, QTableView, QAbstractItemView,
                              QHeaderView, QFileDialog, QMessageBox, QGroupBox, QFormLayout, 
-                             QDoubleSpinBox, QStatusBar, QMenuBar, QMenu, QAction, QDialog,
-                             QDialogButtonBox, QProgressBar, QSizePolicy, QFrame, QSplitter, QGridLayout) # QGridLayout اضافه شد
-from PyQt5.QtCore import Qt, QTimer, QSize
-from PyQt5.QtGui import QFont, QPixmap, QPainter
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+                             QDoubleSpinBox, QStatusBar, QAction, QActionGroup, QDialog,
+                             QDialogButtonBox, QProgressBar, QSizePolicy, QFrame, QSplitter, QGridLayout,
+                             QListWidget, QListWidgetItem, QTabWidget, QTableWidget, QTableWidgetItem) # QGridLayout اضافه شد
+from PyQt5.QtCore import (Qt, QTimer, QSize, QAbstractTableModel, QModelIndex, QObject, QThread, QThreadPool, QRunnable,
+                          QCoreApplication, QBuffer, QIODevice, QRectF, QPointF, QMarginsF, pyqtSignal, pyqtSlot)
+from PyQt5.QtGui import QFont, QPixmap, QPainter, QImage, QImageReader, QPdfWriter, QPageSize, QPageLayout
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.figure import Figure
+from matplotlib.colors import LogNorm
 import matplotlib
 
-matplotlib.use('Qt5Agg')
+matplotlib.use('Qt5Agg', force=False)
 matplotlib.rcParams['font.family'] = 'B Nazanin'
 matplotlib.rcParams['axes.unicode_minus'] = False
 
+STUDENT_TABLE_HEADERS = [
+    "ردیف", "نام", "نام خانوادگی", "شماره دانشجویی",
+    "نمره میانترم", "نمره پایان‌ترم", "معدل", "رتبه"
+]
+STUDENT_TABLE_COLUMNS = ["id", "first_name", "last_name", "student_id", "midterm", "final", "average", "rank"]
+
+
+DATABASE_PATH = 'students.db'
+EXCELLENT_AVERAGE = 17
+HISTOGRAM_BINS = 20
+MAX_GRADE = 20
+DENSITY_BINS = 40
+GRADE_BANDS = 4
+ANALYTICS_MAX_POINTS = 1000
+SEARCH_DEBOUNCE_MS = 300
+DATABASE_BUSY_TIMEOUT_MS = 30000
+DATABASE_CACHE_KIB = 32768
+READER_POOL_SIZE = 4
+CHANGE_POLL_MS = 1000
+CHANGE_RELOAD_THRESHOLD = 1000
+CHANGE_LOG_KEEP = 10000
+# جابه‌جایی گروهی رتبه‌ها به جای یک ردیف برای هر دانشجو با یک ردیف change_log با این شناسه و بازه معدل دانشجویان متاثر ثبت می‌شود
+RANK_CHANGE_PK = 0
+BACKUP_PAGES_PER_STEP = 1024
+
+# نسخه‌های خودکار به صورت تکه‌های فشرده با آدرس محتوایی ذخیره می‌شوند تا صفحه‌های تغییرنکرده تنها یک بار نگهداری شوند
+SNAPSHOT_DIR = 'snapshots'
+SNAPSHOT_INTERVAL_MS = 60 * 60 * 1000
+# هر تکه ۴ صفحه است: تغییر یک صفحه کل تکه‌اش را دوباره ذخیره می‌کند، ولی تکه تک‌صفحه‌ای تعداد فایل‌ها و حجم هر فهرست نسخه را چهار برابر می‌کند.
+# برای ویرایش یک دانشجو در پایگاه داده ۱۰۰ هزار نفری: ۳۲ صفحه ۱۱۹۲ + ۱۶، ۴ صفحه ۲۰۰ + ۱۳۳ و ۱ صفحه ۶۸ + ۵۳۲ کیلوبایت (تکه‌های جدید + فهرست)
+SNAPSHOT_CHUNK_PAGES = 4
+SNAPSHOT_KEEP_LAST = 24
+SNAPSHOT_KEEP_DAILY = 30
+
+PHOTO_DIR = 'photos'
+PHOTO_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+PHOTO_MAX_SIZE = 600
+# فایل‌های تازه‌تر از این مهلت ممکن است به تراکنشی در نمونه دیگر برنامه تعلق داشته باشند که هنوز commit نشده و حذف نمی‌شوند
+PHOTO_GRACE_SECONDS = 60 * 60
+THUMBNAIL_DIR = 'thumbnails'
+THUMBNAIL_MEMORY_ITEMS = 256
+THUMBNAIL_THREADS = 2
+TRANSCRIPT_PHOTO_SIZE = 150
+# فهرست نام فایل و هش داده‌های هر کارنامه ساخته‌شده در پوشه خروجی؛ ادامه کار فقط کارنامه‌های تغییرکرده را دوباره می‌سازد
+TRANSCRIPT_INDEX = 'transcripts.index'
+
+# ایندکس‌های مدیریت‌شده جدول دانشجویان؛ ایندکس‌هایی با این پیشوند که در این فهرست نباشند حذف می‌شوند
+STUDENT_INDEXES = {
+    "idx_students_average": "students(average)",
+    "idx_students_grades": "students(midterm, final, average)",
+    "idx_students_final": "students(final)",
+    "idx_students_rank": "students(rank)",
+    "idx_students_registration_date": "students(registration_date)",
+    "idx_students_first_name": "students(first_name)",
+    "idx_students_last_name": "students(last_name)",
+}
+
+QUERY_DEBUG = os.environ.get("STUDENTS_QUERY_DEBUG") == "1"
+query_logger = logging.getLogger("students.queries")
+SLOW_QUERY_MS = float(os.environ.get("STUDENTS_SLOW_QUERY_MS", "100"))
+SLOW_QUERY_LOG_SIZE = 200
+SLOW_QUERY_PARAMS_CHARS = 300
+LATENCY_WINDOW = 1000
+LATENCY_MAX_KEYS = 500
+SQL_PLACEHOLDER_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+
+
+@functools.lru_cache(maxsize=1024)
+def normalize_sql(sql):
+    # فهرست‌های طولانی ? در IN یک کلید مشترک می‌گیرند تا هر اندازه دسته یک دستور جدا حساب نشود
+    return SQL_PLACEHOLDER_LIST.sub("?, ...", " ".join(sql.split()))
+
+
+def explain_query(conn, sql, parameters):
+    # با execute پایه اجرا می‌شود تا خود EXPLAIN اندازه‌گیری نشود
+    try:
+        return [row[-1] for row in sqlite3.Connection.execute(conn, "EXPLAIN QUERY PLAN " + sql, parameters).fetchall()]
+    except sqlite3.Error:
+        return []
+
+
+class LatencyStats:
+    # آخرین LATENCY_WINDOW نمونه نگه داشته می‌شود و صدک‌ها از همین پنجره چرخان محاسبه می‌شوند
+    def __init__(self, window=LATENCY_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def summary(self):
+        samples = sorted(self.samples)
+
+        def percentile(p):
+            return samples[max(0, math.ceil(p * len(samples)) - 1)] * 1000
+
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": samples[-1] * 1000,
+        }
+
+
+class Instrumentation:
+    # زمان همه دستورهای پایگاه داده و عملیات کاربر از همه رشته‌ها در اینجا جمع می‌شود؛ دستورهای کندتر از آستانه با پارامترها و طرح اجرا ثبت می‌شوند
+    OTHER_KEY = "(سایر)"
+
+    def __init__(self, slow_query_ms=SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = datetime.datetime.now()
+            self.statements = {}
+            self.operations = {}
+            self.slow_queries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+
+    def record(self, table, key, seconds):
+        with self.lock:
+            stats = table.get(key)
+            if stats is None:
+                if len(table) >= LATENCY_MAX_KEYS:
+                    key = self.OTHER_KEY
+                stats = table.setdefault(key, LatencyStats())
+            stats.add(seconds)
+
+    def record_statement(self, conn, sql, parameters, seconds, many=False):
+        key = normalize_sql(sql)
+        self.record(self.statements, key, seconds)
+        elapsed_ms = seconds * 1000
+        if elapsed_ms < self.slow_query_ms:
+            return
+        # پارامترهای executemany یک بار مصرف شده‌اند و طرح اجرا بدون آن‌ها قابل گرفتن نیست
+        plan = [] if many else explain_query(conn, sql, parameters)
+        entry = {
+            "time": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "elapsed_ms": elapsed_ms,
+            "sql": key,
+            "params": "executemany" if many else repr(parameters)[:SLOW_QUERY_PARAMS_CHARS],
+            "plan": plan,
+            "thread": threading.current_thread().name,
+        }
+        with self.lock:
+            self.slow_queries.append(entry)
+        query_logger.warning("slow query %.2f ms: %s %s\n    %s", elapsed_ms, key, entry["params"], "\n    ".join(plan))
+
+    @contextmanager
+    def measure(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(self.operations, name, time.perf_counter() - started)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "started": self.started.strftime("%Y-%m-%d %H:%M:%S"),
+                "created": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "slow_query_ms": self.slow_query_ms,
+                "operations": sorted(({"name": name, **stats.summary()} for name, stats in self.operations.items()),
+                                     key=lambda item: -item["p95_ms"]),
+                "statements": sorted(({"sql": sql, **stats.summary()} for sql, stats in self.statements.items()),
+                                     key=lambda item: -item["p95_ms"]),
+                "slow_queries": list(reversed(self.slow_queries)),
+            }
+
+    def export(self, file_path):
+        snapshot = self.snapshot()
+        with open(file_path, "w", encoding="utf-8") as f:
+            if file_path.lower().endswith(".json"):
+                json.dump(snapshot, f, ensure_ascii=False, indent=2)
+                return
+            f.write(f"گزارش عملکرد از {snapshot['started']} تا {snapshot['created']}\n")
+            f.write(f"آستانه پرس‌وجوی کند: {snapshot['slow_query_ms']:.0f} ms\n")
+            for title, rows, name_key in (("عملیات", snapshot["operations"], "name"), ("دستورات پایگاه داده", snapshot["statements"], "sql")):
+                f.write(f"\n{title}\n{'count':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}  نام\n")
+                for row in rows:
+                    f.write(f"{row['count']:>8} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f} {row['max_ms']:>9.2f}  {row[name_key]}\n")
+            f.write("\nپرس‌وجوهای کند\n")
+            for entry in snapshot["slow_queries"]:
+                f.write(f"{entry['time']} {entry['elapsed_ms']:.2f} ms [{entry['thread']}] {entry['sql']} {entry['params']}\n")
+                for detail in entry["plan"]:
+                    f.write(f"    {detail}\n")
+
+
+instrumentation = Instrumentation()
+
+
+def measured(name):
+    # Qt آرگومان‌های سیگنال (مثل checked) را به اسلات می‌دهد؛ مانند خود PyQt فقط به تعداد پارامترهای تابع اصلی پاس داده می‌شود
+    def decorate(func):
+        arg_count = func.__code__.co_argcount
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with instrumentation.measure(name):
+                return func(*args[:arg_count], **kwargs)
+        return wrapper
+    return decorate
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    # زمان هر دستور از execute تا آخرین fetch جمع و هنگام تمام شدن ردیف‌ها، اجرای دستور بعدی یا آزاد شدن cursor ثبت می‌شود
+    def __init__(self, connection):
+        super().__init__(connection)
+        self.statement = None
+        self.elapsed = 0.0
+
+    def finish(self):
+        if self.statement is not None:
+            sql, parameters = self.statement
+            self.statement = None
+            instrumentation.record_statement(self.connection, sql, parameters, self.elapsed)
+
+    def execute(self, sql, parameters=()):
+        self.finish()
+        started = time.perf_counter()
+        try:
+            super().execute(sql, parameters)
+        finally:
+            self.statement = (sql, parameters)
+            self.elapsed = time.perf_counter() - started
+        if self.description is None:
+            self.finish()
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self.finish()
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            instrumentation.record_statement(self.connection, sql, None, time.perf_counter() - started, many=True)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self.elapsed += time.perf_counter() - started
+        if row is None:
+            self.finish()
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self.elapsed += time.perf_counter() - started
+        if not rows:
+            self.finish()
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self.elapsed += time.perf_counter() - started
+        self.finish()
+        return rows
+
+    def __next__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+    def close(self):
+        self.finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self.finish()
+        except Exception:
+            pass
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def open_connection(path=DATABASE_PATH, read_only=False):
+    # پایگاه داده در حالت WAL است تا خواندن‌ها و نوشتن‌ها یکدیگر را مسدود نکنند؛ اتصال‌های خواندنی می‌توانند بین رشته‌ها جابه‌جا شوند
+    conn = sqlite3.connect(path, timeout=DATABASE_BUSY_TIMEOUT_MS / 1000, check_same_thread=not read_only,
+                           factory=InstrumentedConnection)
+    conn.execute(f"PRAGMA busy_timeout = {DATABASE_BUSY_TIMEOUT_MS}")
+    if not read_only:
+        conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = -{DATABASE_CACHE_KIB}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    if read_only:
+        conn.execute("PRAGMA query_only = ON")
+    return conn
+
+
+class ConnectionManager:
+    # یک اتصال نویسنده برای رشته اصلی و مجموعه‌ای کوچک از اتصال‌های فقط‌خواندنی برای جدول، جستجو و داشبورد
+    def __init__(self, path=DATABASE_PATH, pool_size=READER_POOL_SIZE):
+        self.path = path
+        self.writer = open_connection(path)
+        self.readers = queue.LifoQueue(maxsize=pool_size)
+
+    def acquire_reader(self):
+        try:
+            return self.readers.get_nowait()
+        except queue.Empty:
+            return open_connection(self.path, read_only=True)
+
+    def release_reader(self, conn):
+        try:
+            self.readers.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    @contextmanager
+    def reader(self):
+        conn = self.acquire_reader()
+        try:
+            yield conn
+        finally:
+            self.release_reader(conn)
+
+    def close(self):
+        while True:
+            try:
+                self.readers.get_nowait().close()
+            except queue.Empty:
+                break
+        self.writer.execute("PRAGMA optimize")
+        self.writer.close()
+
+
+def create_students_table(cursor):
+    # داده‌های حجیم (مثلاً در بنچمارک‌ها) می‌توانند پیش از ensure_schema درج شوند؛ ایندکس‌ها و جدول‌های وابسته سپس یک‌جا ساخته می‌شوند
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS students (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            first_name TEXT NOT NULL,
+            last_name TEXT NOT NULL,
+            student_id TEXT UNIQUE NOT NULL,
+            midterm REAL,
+            final REAL,
+            average REAL,
+            rank INTEGER,
+            registration_date TEXT,
+            photo_path TEXT
+        )
+    ''')
+
+
+def ensure_schema(conn):
+    cursor = conn.cursor()
+    create_students_table(cursor)
+    
+    cursor.execute("PRAGMA table_info(students)")
+    columns = [column[1] for column in cursor.fetchall()]
+    
+    if 'registration_date' not in columns:
+        cursor.execute("ALTER TABLE students ADD COLUMN registration_date TEXT")
+    
+    if 'photo_path' not in columns:
+        cursor.execute("ALTER TABLE students ADD COLUMN photo_path TEXT")
+    
+    create_indexes(cursor)
+    create_stats_schema(cursor)
+    create_histogram_schema(cursor)
+    create_analytics_schema(cursor)
+    full_text_search = create_search_schema(cursor)
+    create_change_log_schema(cursor)
+    create_photo_schema(cursor)
+    conn.commit()
+    return full_text_search
+
+
+def create_indexes(cursor):
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='index' AND tbl_name='students' AND name LIKE 'idx_students_%'")
+    for (name,) in cursor.fetchall():
+        if name not in STUDENT_INDEXES:
+            cursor.execute(f"DROP INDEX IF EXISTS {name}")
+    for name, definition in STUDENT_INDEXES.items():
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}")
+
+
+def set_query_debug(enabled):
+    global QUERY_DEBUG
+    QUERY_DEBUG = enabled
+
+
+def run_query(conn, query, params=()):
+    # در حالت اشکال‌زدایی، طرح اجرای پرس‌وجو و زمان آن ثبت می‌شود و پیمایش کامل جدول به صورت هشدار گزارش می‌شود
+    if not QUERY_DEBUG:
+        return conn.execute(query, params).fetchall()
+    
+    plan = conn.execute("EXPLAIN QUERY PLAN " + query, params).fetchall()
+    started = time.perf_counter()
+    rows = conn.execute(query, params).fetchall()
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    
+    details = [row[-1] for row in plan]
+    full_scan = any(detail.startswith("SCAN students") and "USING" not in detail and "VIRTUAL TABLE" not in detail
+                    for detail in details)
+    query_logger.log(
+        logging.WARNING if full_scan else logging.INFO,
+        "%.2f ms, %d rows: %s %s\n    %s",
+        elapsed_ms, len(rows), " ".join(query.split()), list(params), "\n    ".join(details)
+    )
+    return rows
+
+
+def create_stats_schema(cursor):
+    # آمار داشبورد در یک ردیف نگهداری و با تریگر به‌روز می‌شود؛ بیشینه فقط وقتی خود ردیف بیشینه تغییر کند از روی ایندکس معدل دوباره خوانده می‌شود
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS student_stats (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            student_count INTEGER NOT NULL,
+            graded_count INTEGER NOT NULL,
+            average_sum REAL NOT NULL,
+            max_average REAL,
+            excellent_count INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute(f'''
+        INSERT OR IGNORE INTO student_stats (id, student_count, graded_count, average_sum, max_average, excellent_count)
+        SELECT 1, COUNT(*), COUNT(average), IFNULL(SUM(average), 0), MAX(average),
+               COUNT(CASE WHEN average >= {EXCELLENT_AVERAGE} THEN 1 END)
+        FROM students
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS students_stats_insert AFTER INSERT ON students
+        BEGIN
+            UPDATE student_stats SET
+                student_count = student_count + 1,
+                graded_count = graded_count + (NEW.average IS NOT NULL),
+                average_sum = average_sum + IFNULL(NEW.average, 0),
+                max_average = CASE
+                    WHEN NEW.average IS NOT NULL AND (max_average IS NULL OR NEW.average > max_average) THEN NEW.average
+                    ELSE max_average
+                END,
+                excellent_count = excellent_count + IFNULL(NEW.average >= {EXCELLENT_AVERAGE}, 0)
+            WHERE id = 1;
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS students_stats_delete AFTER DELETE ON students
+        BEGIN
+            UPDATE student_stats SET
+                student_count = student_count - 1,
+                graded_count = graded_count - (OLD.average IS NOT NULL),
+                average_sum = average_sum - IFNULL(OLD.average, 0),
+                max_average = CASE
+                    WHEN OLD.average IS NOT NULL AND OLD.average >= max_average THEN (SELECT MAX(average) FROM students)
+                    ELSE max_average
+                END,
+                excellent_count = excellent_count - IFNULL(OLD.average >= {EXCELLENT_AVERAGE}, 0)
+            WHERE id = 1;
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS students_stats_update AFTER UPDATE OF average ON students
+        WHEN OLD.average IS NOT NEW.average
+        BEGIN
+            UPDATE student_stats SET
+                graded_count = graded_count + (NEW.average IS NOT NULL) - (OLD.average IS NOT NULL),
+                average_sum = average_sum + IFNULL(NEW.average, 0) - IFNULL(OLD.average, 0),
+                max_average = CASE
+                    WHEN NEW.average IS NOT NULL AND (max_average IS NULL OR NEW.average >= max_average) THEN NEW.average
+                    WHEN OLD.average IS NOT NULL AND OLD.average >= max_average THEN (SELECT MAX(average) FROM students)
+                    ELSE max_average
+                END,
+                excellent_count = excellent_count
+                    + IFNULL(NEW.average >= {EXCELLENT_AVERAGE}, 0) - IFNULL(OLD.average >= {EXCELLENT_AVERAGE}, 0)
+            WHERE id = 1;
+        END
+    ''')
+
+
+def histogram_bin(column, bins=HISTOGRAM_BINS):
+    # بازه‌های هم‌عرض روی 0 تا 20؛ نمره 20 در آخرین بازه قرار می‌گیرد
+    width = MAX_GRADE / bins
+    return f"MAX(0, MIN({bins - 1}, CAST({column} / {width} AS INTEGER)))"
+
+
+def create_histogram_schema(cursor):
+    # توزیع معدل‌ها با تریگر نگهداری می‌شود تا نمودار بدون خواندن تک‌تک معدل‌ها رسم شود
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='average_histogram'")
+    exists = cursor.fetchone() is not None
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS average_histogram (
+            bin INTEGER PRIMARY KEY,
+            student_count INTEGER NOT NULL
+        )
+    ''')
+    if not exists:
+        cursor.executemany("INSERT INTO average_histogram (bin, student_count) VALUES (?, 0)", [(i,) for i in range(HISTOGRAM_BINS)])
+        cursor.execute(f'''
+            SELECT {histogram_bin("average")}, COUNT(*) FROM students WHERE average IS NOT NULL GROUP BY 1
+        ''')
+        cursor.executemany(
+            "UPDATE average_histogram SET student_count = ? WHERE bin = ?",
+            [(count, bin_index) for bin_index, count in cursor.fetchall()]
+        )
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS students_histogram_insert AFTER INSERT ON students
+        WHEN NEW.average IS NOT NULL
+        BEGIN
+            UPDATE average_histogram SET student_count = student_count + 1 WHERE bin = {histogram_bin("NEW.average")};
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS students_histogram_delete AFTER DELETE ON students
+        WHEN OLD.average IS NOT NULL
+        BEGIN
+            UPDATE average_histogram SET student_count = student_count - 1 WHERE bin = {histogram_bin("OLD.average")};
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS students_histogram_update AFTER UPDATE OF average ON students
+        WHEN OLD.average IS NOT NEW.average
+        BEGIN
+            UPDATE average_histogram SET student_count = student_count - 1
+            WHERE OLD.average IS NOT NULL AND bin = {histogram_bin("OLD.average")};
+            UPDATE average_histogram SET student_count = student_count + 1
+            WHERE NEW.average IS NOT NULL AND bin = {histogram_bin("NEW.average")};
+        END
+    ''')
+
+
+def create_analytics_schema(cursor):
+    # جدول چگالی میانترم × پایان‌ترم و تعداد ثبت‌نام روزانه با تریگر نگهداری می‌شوند تا تحلیل‌ها به تعداد دانشجویان وابسته نباشند
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='grade_density'")
+    exists = cursor.fetchone() is not None
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS grade_density (
+            midterm_bin INTEGER NOT NULL,
+            final_bin INTEGER NOT NULL,
+            student_count INTEGER NOT NULL,
+            PRIMARY KEY (midterm_bin, final_bin)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS enrollment_daily (
+            day TEXT PRIMARY KEY,
+            student_count INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    if not exists:
+        cursor.execute(f'''
+            INSERT INTO grade_density (midterm_bin, final_bin, student_count)
+            SELECT {histogram_bin("midterm", DENSITY_BINS)}, {histogram_bin("final", DENSITY_BINS)}, COUNT(*)
+            FROM students WHERE midterm IS NOT NULL AND final IS NOT NULL
+            GROUP BY 1, 2
+        ''')
+        cursor.execute('''
+            INSERT INTO enrollment_daily (day, student_count)
+            SELECT substr(registration_date, 1, 10), COUNT(*) FROM students
+            WHERE registration_date IS NOT NULL GROUP BY 1
+        ''')
+
+    def add_density(row, delta):
+        return f'''
+            INSERT OR IGNORE INTO grade_density (midterm_bin, final_bin, student_count)
+            SELECT {histogram_bin(f"{row}.midterm", DENSITY_BINS)}, {histogram_bin(f"{row}.final", DENSITY_BINS)}, 0
+            WHERE {row}.midterm IS NOT NULL AND {row}.final IS NOT NULL;
+            UPDATE grade_density SET student_count = student_count {delta}
+            WHERE {row}.midterm IS NOT NULL AND {row}.final IS NOT NULL
+              AND midterm_bin = {histogram_bin(f"{row}.midterm", DENSITY_BINS)}
+              AND final_bin = {histogram_bin(f"{row}.final", DENSITY_BINS)};
+        '''
+
+    def add_enrollment(row, delta):
+        return f'''
+            INSERT OR IGNORE INTO enrollment_daily (day, student_count)
+            SELECT substr({row}.registration_date, 1, 10), 0 WHERE {row}.registration_date IS NOT NULL;
+            UPDATE enrollment_daily SET student_count = student_count {delta}
+            WHERE day = substr({row}.registration_date, 1, 10);
+        '''
+
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS students_analytics_insert AFTER INSERT ON students
+        BEGIN
+            {add_density("NEW", "+ 1")}
+            {add_enrollment("NEW", "+ 1")}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS students_analytics_delete AFTER DELETE ON students
+        BEGIN
+            {add_density("OLD", "- 1")}
+            {add_enrollment("OLD", "- 1")}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS students_analytics_grades AFTER UPDATE OF midterm, final ON students
+        WHEN OLD.midterm IS NOT NEW.midterm OR OLD.final IS NOT NEW.final
+        BEGIN
+            {add_density("OLD", "- 1")}
+            {add_density("NEW", "+ 1")}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS students_analytics_registration AFTER UPDATE OF registration_date ON students
+        WHEN OLD.registration_date IS NOT NEW.registration_date
+        BEGIN
+            {add_enrollment("OLD", "- 1")}
+            {add_enrollment("NEW", "+ 1")}
+        END
+    ''')
+
+
+def create_search_schema(cursor):
+    # ایندکس trigram جستجوی زیررشته‌ای روی نام، نام خانوادگی و شماره دانشجویی را بدون پیمایش کل جدول ممکن می‌کند
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='students_fts'")
+    exists = cursor.fetchone() is not None
+    try:
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS students_fts USING fts5(
+                first_name, last_name, student_id,
+                content='students', content_rowid='id', tokenize='trigram'
+            )
+        ''')
+    except sqlite3.OperationalError:
+        return False
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS students_fts_insert AFTER INSERT ON students
+        BEGIN
+            INSERT INTO students_fts (rowid, first_name, last_name, student_id)
+            VALUES (NEW.id, NEW.first_name, NEW.last_name, NEW.student_id);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS students_fts_delete AFTER DELETE ON students
+        BEGIN
+            INSERT INTO students_fts (students_fts, rowid, first_name, last_name, student_id)
+            VALUES ('delete', OLD.id, OLD.first_name, OLD.last_name, OLD.student_id);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS students_fts_update AFTER UPDATE OF first_name, last_name, student_id ON students
+        BEGIN
+            INSERT INTO students_fts (students_fts, rowid, first_name, last_name, student_id)
+            VALUES ('delete', OLD.id, OLD.first_name, OLD.last_name, OLD.student_id);
+            INSERT INTO students_fts (rowid, first_name, last_name, student_id)
+            VALUES (NEW.id, NEW.first_name, NEW.last_name, NEW.student_id);
+        END
+    ''')
+    if not exists:
+        cursor.execute("INSERT INTO students_fts (students_fts) VALUES ('rebuild')")
+    return True
+
+
+def create_change_log_schema(cursor):
+    # هر تغییر در جدول دانشجویان با یک شماره ترتیبی صعودی ثبت می‌شود تا نمونه‌های دیگر برنامه فقط ردیف‌های تغییرکرده را بخوانند
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_pk INTEGER NOT NULL,
+            average_low REAL,
+            average_high REAL
+        )
+    ''')
+    cursor.execute("PRAGMA table_info(change_log)")
+    if 'average_low' not in [column[1] for column in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE change_log ADD COLUMN average_low REAL")
+        cursor.execute("ALTER TABLE change_log ADD COLUMN average_high REAL")
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS students_change_insert AFTER INSERT ON students
+        BEGIN
+            INSERT INTO change_log (student_pk) VALUES (NEW.id);
+        END
+    ''')
+    # ستون rank عمدا در فهرست نیست: هر افزودن یا ویرایش رتبه بازه‌ای از دانشجویان را جابه‌جا می‌کند و با log_rank_change ثبت می‌شود
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type='trigger' AND name='students_change_update'")
+    row = cursor.fetchone()
+    if row is not None and "UPDATE OF" not in row[0]:
+        cursor.execute("DROP TRIGGER students_change_update")
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS students_change_update
+        AFTER UPDATE OF first_name, last_name, student_id, midterm, final, average, registration_date, photo_path ON students
+        BEGIN
+            INSERT INTO change_log (student_pk) VALUES (NEW.id);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS students_change_delete AFTER DELETE ON students
+        BEGIN
+            INSERT INTO change_log (student_pk) VALUES (OLD.id);
+        END
+    ''')
+
+
+def log_rank_change(conn, average_low=None, average_high=None):
+    # مرز خالی یعنی بی‌کران؛ مرزها شامل خود مقدار هستند
+    conn.execute(
+        "INSERT INTO change_log (student_pk, average_low, average_high) VALUES (?, ?, ?)",
+        (RANK_CHANGE_PK, average_low, average_high)
+    )
+
+
+def create_photo_schema(cursor):
+    # تعداد دانشجویانی که به هر عکس مخزن ارجاع می‌دهند؛ عکس‌هایی با ارجاع صفر با PhotoStore.collect_garbage حذف می‌شوند
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='photo_refs'")
+    exists = cursor.fetchone() is not None
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS photo_refs (
+            photo_path TEXT PRIMARY KEY,
+            refcount INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS students_photo_insert AFTER INSERT ON students
+        WHEN NEW.photo_path LIKE '{PHOTO_DIR}/%'
+        BEGIN
+            INSERT OR IGNORE INTO photo_refs (photo_path, refcount) VALUES (NEW.photo_path, 0);
+            UPDATE photo_refs SET refcount = refcount + 1 WHERE photo_path = NEW.photo_path;
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS students_photo_delete AFTER DELETE ON students
+        WHEN OLD.photo_path LIKE '{PHOTO_DIR}/%'
+        BEGIN
+            UPDATE photo_refs SET refcount = refcount - 1 WHERE photo_path = OLD.photo_path;
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS students_photo_update AFTER UPDATE OF photo_path ON students
+        WHEN OLD.photo_path IS NOT NEW.photo_path
+        BEGIN
+            UPDATE photo_refs SET refcount = refcount - 1 WHERE photo_path = OLD.photo_path;
+            INSERT OR IGNORE INTO photo_refs (photo_path, refcount)
+            SELECT NEW.photo_path, 0 WHERE NEW.photo_path LIKE '{PHOTO_DIR}/%';
+            UPDATE photo_refs SET refcount = refcount + 1 WHERE photo_path = NEW.photo_path;
+        END
+    ''')
+    if not exists:
+        cursor.execute(f'''
+            INSERT INTO photo_refs (photo_path, refcount)
+            SELECT photo_path, COUNT(*) FROM students WHERE photo_path LIKE '{PHOTO_DIR}/%' GROUP BY photo_path
+        ''')
+
+
+class PhotoStore:
+    # عکس‌ها با نام sha256 محتوایشان در photos/ab/hash.ext کپی می‌شوند و photo_path نسبی به پوشه برنامه ذخیره می‌شود؛ یک عکس مشترک تنها یک بار نگهداری می‌شود
+    def __init__(self, root=PHOTO_DIR):
+        self.root = root
+
+    def is_managed(self, photo_path):
+        return bool(photo_path) and photo_path.startswith(self.root + "/")
+
+    @staticmethod
+    def file_digest(path):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def path_digest(photo_path):
+        return os.path.splitext(os.path.basename(photo_path))[0]
+
+    @staticmethod
+    def copy_file(source_path, target_path):
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        temp_path = target_path + ".tmp"
+        shutil.copyfile(source_path, temp_path)
+        os.replace(temp_path, target_path)
+
+    def add(self, conn, source_path):
+        # ردیف photo_refs پیش از کپی و در تراکنش فراخواننده ثبت می‌شود؛ قفل نوشتن تا commit مانع حذف همین فایل توسط نمونه دیگر برنامه است
+        if self.is_managed(source_path):
+            return source_path
+        digest = self.file_digest(source_path)
+        extension = os.path.splitext(source_path)[1].lower()
+        photo_path = f"{self.root}/{digest[:2]}/{digest}{extension}"
+        conn.execute("INSERT OR IGNORE INTO photo_refs (photo_path, refcount) VALUES (?, 0)", (photo_path,))
+        if os.path.exists(photo_path):
+            os.utime(photo_path)
+        else:
+            self.copy_file(source_path, photo_path)
+        return photo_path
+
+    def add_data(self, data, extension):
+        digest = hashlib.sha256(data).hexdigest()
+        photo_path = f"{self.root}/{digest[:2]}/{digest}{extension}"
+        # در پردازه فرزند اتصالی به پایگاه داده نیست؛ تاریخ فایل موجود تازه می‌شود تا تا ثبت در تراکنش پردازه اصلی در دوره مهلت بماند
+        if os.path.exists(photo_path):
+            os.utime(photo_path)
+        else:
+            os.makedirs(os.path.dirname(photo_path), exist_ok=True)
+            temp_path = f"{photo_path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, photo_path)
+        return photo_path
+
+    def photo_paths(self, conn):
+        cursor = conn.execute(f"SELECT DISTINCT photo_path FROM students WHERE photo_path LIKE '{self.root}/%'")
+        return [row[0] for row in cursor]
+
+    def adopt_external(self, conn, progress=None):
+        # عکس‌هایی که هنوز با مسیر مطلق ثبت شده‌اند یک بار به مخزن منتقل می‌شوند؛ کپی و به‌روزرسانی هر عکس در یک تراکنش است
+        rows = conn.execute(
+            f"SELECT id, photo_path FROM students WHERE photo_path IS NOT NULL AND photo_path != '' AND photo_path NOT LIKE '{self.root}/%'"
+        ).fetchall()
+        adopted = 0
+        for i, (pk, path) in enumerate(rows, 1):
+            if os.path.isfile(path):
+                with conn:
+                    conn.execute("UPDATE students SET photo_path=? WHERE id=?", (self.add(conn, path), pk))
+                adopted += 1
+            if progress:
+                progress(i, len(rows))
+        return adopted
+
+    @contextmanager
+    def write_lock(self, conn):
+        # حذف فایل‌ها زیر قفل نوشتن و پیش از commit انجام می‌شود تا هم‌زمان با آن عکسی در نمونه دیگر ثبت نشود
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    @staticmethod
+    def is_recent(path, grace_seconds):
+        try:
+            return os.path.getmtime(path) > time.time() - grace_seconds
+        except FileNotFoundError:
+            return False
+
+    def collect_garbage(self, conn, grace_seconds=PHOTO_GRACE_SECONDS):
+        # ردیف عکس‌های تازه با ارجاع صفر می‌ماند تا در اجرای بعدی پس از پایان مهلت حذف شود
+        removed = []
+        with self.write_lock(conn):
+            for (photo_path,) in conn.execute("SELECT photo_path FROM photo_refs WHERE refcount <= 0").fetchall():
+                if self.is_recent(photo_path, grace_seconds):
+                    continue
+                if os.path.exists(photo_path):
+                    os.remove(photo_path)
+                removed.append((photo_path,))
+            conn.executemany("DELETE FROM photo_refs WHERE photo_path = ? AND refcount <= 0", removed)
+        return len(removed)
+
+    def sweep(self, conn, grace_seconds=PHOTO_GRACE_SECONDS):
+        # فایل‌هایی که در photo_refs ثبت نشده‌اند (مثلاً ذخیره‌ای که به خطا خورده) پس از پایان مهلت حذف می‌شوند
+        removed = 0
+        with self.write_lock(conn):
+            referenced = {row[0] for row in conn.execute("SELECT photo_path FROM photo_refs")}
+            for dir_path, _, file_names in os.walk(self.root):
+                for file_name in file_names:
+                    path = os.path.join(dir_path, file_name)
+                    if os.path.relpath(path).replace(os.sep, "/") not in referenced and not self.is_recent(path, grace_seconds):
+                        os.remove(path)
+                        removed += 1
+        return removed
+
+    def sync(self, photo_paths, source_root, target_root, progress=None):
+        # فقط عکس‌هایی که در مقصد نیستند کپی می‌شوند؛ نام فایل همان هش محتواست
+        copied = 0
+        for i, photo_path in enumerate(photo_paths, 1):
+            source_path = os.path.join(source_root, photo_path)
+            target_path = os.path.join(target_root, photo_path)
+            if not os.path.exists(target_path) and os.path.isfile(source_path):
+                if self.file_digest(source_path) == self.path_digest(photo_path):
+                    self.copy_file(source_path, target_path)
+                    copied += 1
+            if progress:
+                progress(i, len(photo_paths))
+        return copied
+
+
+def init_photo_worker():
+    # QImageReader و افزونه‌های قالب تصویر در پردازه فرزند به یک QCoreApplication نیاز دارند
+    global photo_worker_app
+    photo_worker_app = QCoreApplication.instance() or QCoreApplication([])
+
+
+def normalize_photo(source_path, photo_root=PHOTO_DIR):
+    # در پردازه‌های فرزند اجرا می‌شود: عکس کوچک، چرخش EXIF اعمال، پس‌زمینه شفاف سفید و خروجی JPEG در مخزن ذخیره می‌شود
+    reader = QImageReader(source_path)
+    reader.setAutoTransform(True)
+    size = reader.size()
+    if size.isValid() and (size.width() > PHOTO_MAX_SIZE or size.height() > PHOTO_MAX_SIZE):
+        reader.setScaledSize(size.scaled(PHOTO_MAX_SIZE, PHOTO_MAX_SIZE, Qt.KeepAspectRatio))
+    image = reader.read()
+    if image.isNull():
+        raise ValueError(reader.errorString())
+    normalized = QImage(image.size(), QImage.Format_RGB32)
+    normalized.fill(Qt.white)
+    painter = QPainter(normalized)
+    painter.drawImage(0, 0, image)
+    painter.end()
+    buffer = QBuffer()
+    buffer.open(QIODevice.WriteOnly)
+    normalized.save(buffer, "JPG", 90)
+    return PhotoStore(photo_root).add_data(bytes(buffer.data()), ".jpg")
+
+
+class PhotoImporter:
+    # نام هر فایل (بدون پسوند) شماره دانشجویی است؛ عکس‌ها با همه هسته‌ها پردازش و photo_path در یک تراکنش به‌روزرسانی می‌شود
+    def __init__(self, conn):
+        self.conn = conn
+        self.updated_count = 0
+        self.unmatched = []
+        self.failed = []
+
+    def scan(self, folder):
+        files = {}
+        for entry in sorted(os.scandir(folder), key=lambda entry: entry.name):
+            stem, extension = os.path.splitext(entry.name)
+            if entry.is_file() and extension.lower() in PHOTO_EXTENSIONS:
+                files.setdefault(stem.strip(), entry.path)
+        return files
+
+    def match(self, files):
+        student_ids = list(files)
+        pks = {}
+        for start in range(0, len(student_ids), StudentImporter.CHUNK_SIZE):
+            batch = student_ids[start:start + StudentImporter.CHUNK_SIZE]
+            placeholders = ", ".join("?" * len(batch))
+            cursor = self.conn.execute(f"SELECT student_id, id FROM students WHERE student_id IN ({placeholders})", batch)
+            pks.update(cursor.fetchall())
+        self.unmatched = [os.path.basename(path) for student_id, path in files.items() if student_id not in pks]
+        return [(pks[student_id], path) for student_id, path in files.items() if student_id in pks]
+
+    def import_folder(self, folder, progress=None):
+        matched = self.match(self.scan(folder))
+        updates = []
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=context, initializer=init_photo_worker) as executor:
+            futures = {executor.submit(normalize_photo, path): (pk, path) for pk, path in matched}
+            try:
+                for done, future in enumerate(as_completed(futures), 1):
+                    pk, path = futures[future]
+                    try:
+                        updates.append((future.result(), pk))
+                    except Exception as e:
+                        self.failed.append(f"{os.path.basename(path)}: {str(e)}")
+                    if progress:
+                        progress(done, len(futures))
+            except BaseException:
+                executor.shutdown(wait=True, cancel_futures=True)
+                raise
+        with self.conn:
+            self.conn.executemany("UPDATE students SET photo_path=? WHERE id=?", updates)
+        self.updated_count = len(updates)
+        PhotoStore().collect_garbage(self.conn)
+
+
+class ChangeTracker:
+    # PRAGMA data_version اتصال خواندنی با هر commit از اتصال‌های دیگر تغییر می‌کند و data_version اتصال نویسنده فقط با تغییرات بیرونی
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.data_version = self.version(reader)
+        self.writer_version = self.version(writer)
+        self.last_seq = self.log_range()[1]
+
+    def version(self, conn):
+        return conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def log_range(self):
+        first, latest = self.reader.execute(
+            "SELECT (SELECT MIN(seq) FROM change_log), (SELECT MAX(seq) FROM change_log)"
+        ).fetchone()
+        return first, latest or 0
+
+    def sync(self):
+        # مانند poll برمی‌گرداند که آیا از آخرین بررسی اتصال دیگری چیزی نوشته است
+        self.data_version = self.version(self.reader)
+        writer_version = self.version(self.writer)
+        external = writer_version != self.writer_version
+        self.writer_version = writer_version
+        self.last_seq = self.log_range()[1]
+        return external
+
+    def poll(self):
+        # None یعنی تغییری رخ نداده است؛ در غیر این صورت (تغییر بیرونی؟، شناسه ردیف‌های تغییرکرده یا None برای بارگذاری کامل، بازه‌های معدلی که رتبه‌شان جابه‌جا شده)
+        version = self.version(self.reader)
+        if version == self.data_version:
+            return None
+        self.data_version = version
+        writer_version = self.version(self.writer)
+        external = writer_version != self.writer_version
+        self.writer_version = writer_version
+
+        first, latest = self.log_range()
+        last_seq = self.last_seq
+        self.last_seq = latest
+        if latest == last_seq:
+            return external, [], []
+        if latest < last_seq or latest - last_seq > CHANGE_RELOAD_THRESHOLD or (first is not None and first > last_seq + 1):
+            return external, None, []
+        cursor = self.reader.execute(
+            "SELECT DISTINCT student_pk, average_low, average_high FROM change_log WHERE seq > ? AND seq <= ?", (last_seq, latest)
+        )
+        pks = set()
+        rank_ranges = []
+        for student_pk, average_low, average_high in cursor:
+            if student_pk == RANK_CHANGE_PK:
+                rank_ranges.append((average_low, average_high))
+            else:
+                pks.add(student_pk)
+        return external, list(pks), rank_ranges
+
+    def prune(self):
+        first, latest = self.log_range()
+        if first is not None and latest - first >= 2 * CHANGE_LOG_KEEP:
+            with self.writer:
+                self.writer.execute("DELETE FROM change_log WHERE seq <= ?", (latest - CHANGE_LOG_KEEP,))
+
+
+class StudentEvents(QObject):
+    # افزودن، ویرایش و حذف، شناسه ردیف‌های تغییرکرده را منتشر می‌کنند تا نما فقط همان ردیف‌ها را به‌روزرسانی کند
+    students_changed = pyqtSignal(list)
+
+
+def build_search_filter(first_name="", last_name="", student_id="", min_average=None, max_average=None, full_text_search=True):
+    # عبارت‌های کوتاه‌تر از سه حرف با توکن‌ساز trigram قابل جستجو نیستند و به LIKE سپرده می‌شوند
+    conditions = ""
+    params = []
+    match_terms = []
+    
+    for column, text in (("first_name", first_name), ("last_name", last_name), ("student_id", student_id)):
+        text = text.strip()
+        if not text:
+            continue
+        if full_text_search and len(text) >= 3:
+            match_terms.append(f'{column} : "{text.replace(chr(34), chr(34) * 2)}"')
+        else:
+            conditions += f" AND {column} LIKE ?"
+            params.append(f"%{text}%")
+    
+    if match_terms:
+        conditions += " AND id IN (SELECT rowid FROM students_fts WHERE students_fts MATCH ?)"
+        params.append(" AND ".join(match_terms))
+    
+    if min_average is not None:
+        conditions += " AND average >= ?"
+        params.append(min_average)
+    
+    if max_average is not None:
+        conditions += " AND average <= ?"
+        params.append(max_average)
+    
+    return conditions, params
+
+
+RANK_POLICIES = {
+    "competition": ("رقابتی (۱، ۲، ۲، ۴)", "RANK() OVER (ORDER BY average DESC)"),
+    "dense": ("فشرده (۱، ۲، ۲، ۳)", "DENSE_RANK() OVER (ORDER BY average DESC)"),
+    "ordinal": ("ترتیبی (۱، ۲، ۳، ۴)", "ROW_NUMBER() OVER (ORDER BY average DESC, id)"),
+}
+
+
+def rank_all_students(conn, policy="competition"):
+    # رتبه همه دانشجویان با یک دستور مبتنی بر مجموعه محاسبه می‌شود و فقط ردیف‌هایی که رتبه‌شان تغییر کرده بازنویسی می‌شوند
+    rank_expression = RANK_POLICIES[policy][1]
+    ranked = f"SELECT id, CASE WHEN average IS NULL THEN NULL ELSE {rank_expression} END AS new_rank FROM students"
+    with conn:
+        if sqlite3.sqlite_version_info >= (3, 33, 0):
+            cursor = conn.execute(f'''
+                UPDATE students SET rank = ranked.new_rank
+                FROM ({ranked}) AS ranked
+                WHERE students.id = ranked.id AND students.rank IS NOT ranked.new_rank
+            ''')
+        else:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS ranked_students (id INTEGER PRIMARY KEY, new_rank INTEGER)")
+            conn.execute("DELETE FROM ranked_students")
+            conn.execute(f"INSERT INTO ranked_students (id, new_rank) {ranked}")
+            cursor = conn.execute('''
+                UPDATE students SET rank = (SELECT new_rank FROM ranked_students WHERE ranked_students.id = students.id)
+                WHERE rank IS NOT (SELECT new_rank FROM ranked_students WHERE ranked_students.id = students.id)
+            ''')
+            conn.execute("DELETE FROM ranked_students")
+        if cursor.rowcount > 0:
+            log_rank_change(conn)
+    return cursor.rowcount
+
+
+class RankIndex:
+    # فهرست مرتب کلیدهای (منفی معدل، شناسه) برای محاسبه رتبه با جستجوی دودویی؛ پس از هر تغییر فقط بازه رتبه‌های متاثر بازنویسی می‌شود
+    def __init__(self, policy, keys, data_version=None):
+        self.policy = policy
+        self.keys = keys
+        self.data_version = data_version
+        self.distinct = []
+        self.counts = {}
+        for key in keys:
+            if key[0] not in self.counts:
+                self.counts[key[0]] = 0
+                self.distinct.append(key[0])
+            self.counts[key[0]] += 1
+
+    @classmethod
+    def build(cls, conn, policy):
+        cursor = conn.execute("SELECT -average, id FROM students WHERE average IS NOT NULL ORDER BY average DESC, id")
+        return cls(policy, cursor.fetchall(), cls.version(conn))
+
+    @staticmethod
+    def version(conn):
+        return conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def is_current(self, conn):
+        # data_version فقط با commit اتصال‌های دیگر (نمونه‌های دیگر برنامه یا کارهای پس‌زمینه) تغییر می‌کند؛ پس از آن فهرست دیگر معتبر نیست
+        return self.data_version == self.version(conn)
+
+    def rank_of(self, average, student_pk):
+        if self.policy == "dense":
+            return bisect.bisect_left(self.distinct, -average) + 1
+        if self.policy == "ordinal":
+            return bisect.bisect_left(self.keys, (-average, student_pk)) + 1
+        return bisect.bisect_left(self.keys, (-average,)) + 1
+
+    def add(self, average, student_pk):
+        bisect.insort(self.keys, (-average, student_pk))
+        if self.counts.get(-average, 0) == 0:
+            bisect.insort(self.distinct, -average)
+            self.counts[-average] = 0
+        self.counts[-average] += 1
+        return self.counts[-average] == 1
+
+    def remove(self, average, student_pk):
+        position = bisect.bisect_left(self.keys, (-average, student_pk))
+        if position < len(self.keys) and self.keys[position] == (-average, student_pk):
+            del self.keys[position]
+        self.counts[-average] = self.counts.get(-average, 1) - 1
+        if self.counts[-average] <= 0:
+            del self.counts[-average]
+            position = bisect.bisect_left(self.distinct, -average)
+            if position < len(self.distinct) and self.distinct[position] == -average:
+                del self.distinct[position]
+            return True
+        return False
+
+    def ranks_below(self, average, student_pk):
+        if self.policy == "ordinal":
+            return "(average < ? OR (average = ? AND id > ?))", [average, average, student_pk]
+        return "average < ?", [average]
+
+    def apply(self, conn, student_pk, old_average, new_average):
+        removed = old_average is not None and (self.remove(old_average, student_pk) or self.policy != "dense")
+        added = new_average is not None and (self.add(new_average, student_pk) or self.policy != "dense")
+
+        cursor = None
+        shifted_low = None
+        if removed and added:
+            if old_average != new_average:
+                moved_up = new_average > old_average
+                upper, lower = (new_average, old_average) if moved_up else (old_average, new_average)
+                below_upper, upper_params = self.ranks_below(upper, student_pk)
+                below_lower, lower_params = self.ranks_below(lower, student_pk)
+                cursor = conn.execute(
+                    f"UPDATE students SET rank = rank {'+' if moved_up else '-'} 1 "
+                    f"WHERE {below_upper} AND NOT {below_lower} AND id != ?",
+                    upper_params + lower_params + [student_pk]
+                )
+                shifted_low, shifted_high = lower, upper
+        elif removed:
+            below, params = self.ranks_below(old_average, student_pk)
+            cursor = conn.execute(f"UPDATE students SET rank = rank - 1 WHERE {below} AND id != ?", params + [student_pk])
+            shifted_high = old_average
+        elif added:
+            below, params = self.ranks_below(new_average, student_pk)
+            cursor = conn.execute(f"UPDATE students SET rank = rank + 1 WHERE {below} AND id != ?", params + [student_pk])
+            shifted_high = new_average
+        if cursor is not None and cursor.rowcount > 0:
+            log_rank_change(conn, shifted_low, shifted_high)
+
+        if new_average is not None:
+            conn.execute("UPDATE students SET rank=? WHERE id=?", (self.rank_of(new_average, student_pk), student_pk))
+        elif old_average is not None:
+            conn.execute("UPDATE students SET rank=NULL WHERE id=?", (student_pk,))
+
+
+class StudentTableModel(QAbstractTableModel):
+    # ردیف‌ها صفحه به صفحه (keyset) از پایگاه داده خوانده می‌شوند تا حجم جدول روی زمان بارگذاری اثری نداشته باشد
+    PAGE_SIZE = 500
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.conn = None
+        self.conditions = ""
+        self.params = []
+        self.sort_column = 0
+        self.sort_order = Qt.AscendingOrder
+        self.rows = []
+        self.exhausted = True
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(STUDENT_TABLE_HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            value = self.rows[index.row()][index.column()]
+            return "-" if value is None else str(value)
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return STUDENT_TABLE_HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.exhausted:
+            return
+        rows = self.fetch_page(self.rows[-1] if self.rows else None)
+        if not rows:
+            return
+        self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(rows) - 1)
+        self.rows.extend(rows)
+        self.endInsertRows()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sort_column = column
+        self.sort_order = order
+        self.refresh()
+
+    def set_filter(self, conditions, params):
+        self.conditions = conditions
+        self.params = list(params)
+        self.refresh()
+
+    def refresh(self):
+        self.beginResetModel()
+        self.rows = []
+        self.exhausted = self.conn is None
+        if self.conn is not None:
+            self.rows = self.fetch_page(None)
+        self.endResetModel()
+
+    def student_at(self, row):
+        if 0 <= row < len(self.rows):
+            return self.rows[row]
+        return None
+
+    def fetch_page(self, last_row):
+        rows = fetch_student_page(
+            self.conn, self.conditions, self.params, self.sort_column, self.sort_order, last_row, self.PAGE_SIZE
+        )
+        self.exhausted = len(rows) < self.PAGE_SIZE
+        return rows
+
+    def sort_key(self, row):
+        # همان ترتیب ORDER BY در SQLite: NULL در ترتیب صعودی اول است و id ترتیب مقادیر برابر را مشخص می‌کند
+        value = row[self.sort_column]
+        return (value is not None, 0 if value is None else value, row[0])
+
+    def insert_position(self, key):
+        ascending = self.sort_order == Qt.AscendingOrder
+        low, high = 0, len(self.rows)
+        while low < high:
+            middle = (low + high) // 2
+            middle_key = self.sort_key(self.rows[middle])
+            if (middle_key < key) if ascending else (middle_key > key):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def apply_changes(self, pks):
+        # فقط ردیف‌های تغییرکرده از پایگاه داده خوانده و در محدوده بارگذاری‌شده حذف، جابه‌جا یا درج می‌شوند
+        if self.conn is None or not pks:
+            return
+        changed = set(pks)
+        matching = {}
+        pks = list(changed)
+        for start in range(0, len(pks), self.PAGE_SIZE):
+            batch = pks[start:start + self.PAGE_SIZE]
+            placeholders = ", ".join("?" * len(batch))
+            cursor = self.conn.execute(
+                f"SELECT * FROM students WHERE id IN ({placeholders})" + self.conditions, batch + self.params
+            )
+            for row in cursor:
+                matching[row[0]] = row
+        loaded = {row[0]: row for row in self.rows if row[0] in changed}
+        for pk in pks:
+            self.apply_row_change(loaded.get(pk), matching.get(pk))
+
+    def apply_row_change(self, old_row, new_row):
+        old_position = self.insert_position(self.sort_key(old_row)) if old_row is not None else None
+        if new_row is None:
+            if old_position is not None:
+                self.beginRemoveRows(QModelIndex(), old_position, old_position)
+                del self.rows[old_position]
+                self.endRemoveRows()
+            return
+
+        position = self.insert_position(self.sort_key(new_row))
+        beyond_loaded = position == len(self.rows) and not self.exhausted
+        if old_position is None:
+            if not beyond_loaded:
+                self.beginInsertRows(QModelIndex(), position, position)
+                self.rows.insert(position, new_row)
+                self.endInsertRows()
+        elif beyond_loaded:
+            self.beginRemoveRows(QModelIndex(), old_position, old_position)
+            del self.rows[old_position]
+            self.endRemoveRows()
+        elif position in (old_position, old_position + 1):
+            self.rows[old_position] = new_row
+            self.dataChanged.emit(self.index(old_position, 0), self.index(old_position, self.columnCount() - 1))
+        else:
+            self.beginMoveRows(QModelIndex(), old_position, old_position, QModelIndex(), position)
+            del self.rows[old_position]
+            self.rows.insert(position if position < old_position else position - 1, new_row)
+            self.endMoveRows()
+
+    def refresh_ranks(self, rank_ranges):
+        # پس از جابه‌جایی گروهی رتبه‌ها فقط ستون رتبه ردیف‌های بارگذاری‌شده‌ای که معدلشان در بازه‌های متاثر است دوباره خوانده می‌شود؛ اگر جدول بر اساس رتبه مرتب باشد کامل بارگذاری می‌شود
+        if self.conn is None or not self.rows:
+            return
+        rank_column = STUDENT_TABLE_COLUMNS.index("rank")
+        if self.sort_column == rank_column:
+            self.reload()
+            return
+        average_column = STUDENT_TABLE_COLUMNS.index("average")
+        pks = [
+            row[0] for row in self.rows
+            if row[average_column] is not None and any(
+                (low is None or row[average_column] >= low) and (high is None or row[average_column] <= high)
+                for low, high in rank_ranges
+            )
+        ]
+        ranks = {}
+        for start in range(0, len(pks), self.PAGE_SIZE):
+            batch = pks[start:start + self.PAGE_SIZE]
+            placeholders = ", ".join("?" * len(batch))
+            ranks.update(self.conn.execute(f"SELECT id, rank FROM students WHERE id IN ({placeholders})", batch))
+        changed = []
+        for i, row in enumerate(self.rows):
+            if row[0] in ranks and ranks[row[0]] != row[rank_column]:
+                self.rows[i] = row[:rank_column] + (ranks[row[0]],) + row[rank_column + 1:]
+                changed.append(i)
+        if changed:
+            self.dataChanged.emit(self.index(changed[0], rank_column), self.index(changed[-1], rank_column))
+
+    def reload(self):
+        # ردیف‌های بارگذاری‌شده دوباره خوانده می‌شوند و انتخاب و موقعیت پیمایش بر اساس شناسه ردیف حفظ می‌شود
+        if self.conn is None:
+            return
+        count = max(len(self.rows), self.PAGE_SIZE)
+        rows = fetch_student_page(self.conn, self.conditions, self.params, self.sort_column, self.sort_order, None, count)
+        self.layoutAboutToBeChanged.emit()
+        old_indexes = self.persistentIndexList()
+        old_pks = [self.rows[index.row()][0] for index in old_indexes]
+        self.rows = rows
+        self.exhausted = len(rows) < count
+        positions = {row[0]: i for i, row in enumerate(rows)}
+        new_indexes = [
+            self.index(positions[pk], index.column()) if pk in positions else QModelIndex()
+            for pk, index in zip(old_pks, old_indexes)
+        ]
+        self.changePersistentIndexList(old_indexes, new_indexes)
+        self.layoutChanged.emit()
+
+    def apply_search_results(self, conditions, params, rows):
+        self.beginResetModel()
+        self.conditions = conditions
+        self.params = list(params)
+        self.rows = rows
+        self.exhausted = len(rows) < self.PAGE_SIZE
+        self.endResetModel()
+
+
+def fetch_student_page(conn, conditions, params, sort_column, sort_order, last_row=None, limit=StudentTableModel.PAGE_SIZE):
+    column = STUDENT_TABLE_COLUMNS[sort_column]
+    direction = "ASC" if sort_order == Qt.AscendingOrder else "DESC"
+    query = "SELECT * FROM students WHERE 1=1" + conditions
+    params = list(params)
+
+    if last_row is not None:
+        keyset, keyset_params = keyset_condition(column, sort_column, sort_order, last_row)
+        query += " AND " + keyset
+        params.extend(keyset_params)
+
+    if column == "id":
+        query += f" ORDER BY id {direction} LIMIT ?"
+    else:
+        query += f" ORDER BY {column} {direction}, id {direction} LIMIT ?"
+    params.append(limit)
+
+    return run_query(conn, query, params)
+
+
+def keyset_condition(column, sort_column, sort_order, last_row):
+    # SQLite مقادیر NULL را در ترتیب صعودی اول و در ترتیب نزولی آخر قرار می‌دهد
+    value = last_row[sort_column]
+    last_id = last_row[0]
+    if sort_order == Qt.AscendingOrder:
+        if column == "id":
+            return "id > ?", [last_id]
+        if value is None:
+            return f"(({column} IS NULL AND id > ?) OR {column} IS NOT NULL)", [last_id]
+        return f"({column} > ? OR ({column} = ? AND id > ?))", [value, value, last_id]
+
+    if column == "id":
+        return "id < ?", [last_id]
+    if value is None:
+        return f"({column} IS NULL AND id < ?)", [last_id]
+    return f"({column} < ? OR ({column} = ? AND id < ?) OR {column} IS NULL)", [value, value, last_id]
+
+
+class SearchWorker(QObject):
+    # جستجو در یک رشته جداگانه با اتصال خواندنی مستقل اجرا می‌شود؛ درخواست‌های قدیمی‌تر نادیده گرفته یا با interrupt متوقف می‌شوند
+    search_finished = pyqtSignal(int, str, list, list, int)
+    search_failed = pyqtSignal(int, str)
+
+    def __init__(self, db):
+        super().__init__()
+        self.db = db
+        self.conn = None
+        self.latest_generation = 0
+        self.running_generation = None
+        self.lock = threading.Lock()
+
+    def cancel_before(self, generation):
+        with self.lock:
+            self.latest_generation = generation
+            if self.conn is not None and self.running_generation is not None and self.running_generation < generation:
+                self.conn.interrupt()
+
+    def is_stale(self, generation):
+        with self.lock:
+            return generation < self.latest_generation
+
+    @pyqtSlot(int, str, list, int, int)
+    @measured("search")
+    def search(self, generation, conditions, params, sort_column, sort_order):
+        if self.is_stale(generation):
+            return
+        try:
+            if self.conn is None:
+                self.conn = self.db.acquire_reader()
+            with self.lock:
+                self.running_generation = generation
+            rows = fetch_student_page(self.conn, conditions, params, sort_column, sort_order)
+            if self.is_stale(generation):
+                return
+            total = run_query(self.conn, "SELECT COUNT(*) FROM students WHERE 1=1" + conditions, params)[0][0]
+            if not self.is_stale(generation):
+                self.search_finished.emit(generation, conditions, params, rows, total)
+        except sqlite3.Error as e:
+            if not self.is_stale(generation):
+                self.search_failed.emit(generation, str(e))
+        finally:
+            with self.lock:
+                self.running_generation = None
+
+    def close(self):
+        if self.conn is not None:
+            self.db.release_reader(self.conn)
+            self.conn = None
+
+
+class StudentImporter:
+    # هر دسته از ردیف‌ها ابتدا در یک جدول موقت قرار می‌گیرد و در یک تراکنش به جدول دانشجویان منتقل می‌شود
+    CHUNK_SIZE = 5000
+    MAX_ERROR_MESSAGES = 100
+    REQUIRED_COLUMNS = ["نام", "نام خانوادگی", "شماره دانشجویی"]
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.success_count = 0
+        self.error_count = 0
+        self.errors = []
+        self.registration_date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.conn.execute('''
+            CREATE TEMP TABLE IF NOT EXISTS import_staging (
+                row_no INTEGER PRIMARY KEY,
+                first_name TEXT,
+                last_name TEXT,
+                student_id TEXT,
+                midterm REAL,
+                final REAL,
+                average REAL
+            )
+        ''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS temp.idx_import_staging_student_id ON import_staging(student_id)")
+
+    def error_messages(self):
+        return [message for _, message in self.errors]
+
+    def import_file(self, file_path, progress=None):
+        # فایل به صورت دسته‌های هم‌اندازه خوانده و هر دسته بلافاصله ثبت می‌شود تا مصرف حافظه ثابت بماند
+        if file_path.lower().endswith(".csv"):
+            self.import_csv(file_path, progress)
+        else:
+            self.import_xlsx(file_path, progress)
+
+    def import_csv(self, file_path, progress=None):
+        total_bytes = os.path.getsize(file_path)
+        processed_rows = 0
+        with open(file_path, "r", encoding="utf-8-sig", newline="") as f:
+            # همه ستون‌ها متن خوانده می‌شوند تا شماره دانشجویی (صفرهای ابتدایی، یا 123.0 در دسته‌ای با خانه خالی) مانند فایل xlsx ذخیره شود؛ نمره‌ها در grade_column عدد می‌شوند
+            for chunk in pd.read_csv(f, chunksize=self.CHUNK_SIZE, dtype=str, keep_default_na=False):
+                if processed_rows == 0:
+                    self.check_columns(chunk.columns)
+                self.import_chunk(chunk)
+                processed_rows += len(chunk)
+                if progress:
+                    progress(processed_rows, f.tell(), total_bytes)
+
+    def import_xlsx(self, file_path, progress=None):
+        workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            sheet = workbook.active
+            rows = sheet.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            columns = ["" if value is None else str(value).strip() for value in header]
+            self.check_columns(columns)
+            total_rows = max((sheet.max_row or 1) - 1, 0)
+
+            processed_rows = 0
+            chunk = []
+            chunk_index = []
+            for row_idx, values in enumerate(rows):
+                if all(value is None for value in values):
+                    continue
+                chunk.append(tuple(values[:len(columns)]) + (None,) * (len(columns) - len(values)))
+                chunk_index.append(row_idx)
+                if len(chunk) >= self.CHUNK_SIZE:
+                    self.import_chunk(pd.DataFrame(chunk, columns=columns, index=chunk_index))
+                    processed_rows = row_idx + 1
+                    chunk = []
+                    chunk_index = []
+                    if progress:
+                        progress(processed_rows, processed_rows, total_rows)
+            if chunk:
+                self.import_chunk(pd.DataFrame(chunk, columns=columns, index=chunk_index))
+                processed_rows = chunk_index[-1] + 1
+            if progress:
+                progress(processed_rows, total_rows, total_rows)
+        finally:
+            workbook.close()
+
+    def check_columns(self, columns):
+        for col in self.REQUIRED_COLUMNS:
+            if col not in columns:
+                raise ValueError(f"ستون '{col}' در فایل اکسل یافت نشد")
+
+    def add_errors(self, errors):
+        self.error_count += len(errors)
+        free_slots = self.MAX_ERROR_MESSAGES - len(self.errors)
+        if free_slots > 0:
+            self.errors.extend(sorted(errors)[:free_slots])
+
+    def import_chunk(self, df):
+        chunk_errors = []
+        row_numbers = df.index.to_series() + 1
+        first_names = self.text_column(df, "نام")
+        last_names = self.text_column(df, "نام خانوادگی")
+        student_ids = self.text_column(df, "شماره دانشجویی")
+
+        incomplete = (first_names == "") | (last_names == "") | (student_ids == "")
+        for row_no in row_numbers[incomplete]:
+            chunk_errors.append((row_no, f"ردیف {row_no}: اطلاعات ناقص"))
+
+        midterms, invalid_midterms = self.grade_column(df, "نمره میانترم")
+        finals, invalid_finals = self.grade_column(df, "نمره پایان‌ترم")
+        invalid = (invalid_midterms | invalid_finals) & ~incomplete
+        for row_no in row_numbers[invalid]:
+            chunk_errors.append((row_no, f"ردیف {row_no}: خطا - نمره نامعتبر"))
+
+        averages = (midterms * 0.3) + (finals * 0.7)
+
+        valid = ~(incomplete | invalid)
+        staging = pd.DataFrame({
+            "row_no": row_numbers[valid],
+            "first_name": first_names[valid],
+            "last_name": last_names[valid],
+            "student_id": student_ids[valid],
+            "midterm": midterms[valid],
+            "final": finals[valid],
+            "average": averages[valid],
+        })
+        staging = staging.astype(object).where(staging.notna(), None)
+
+        with self.conn:
+            self.conn.execute("DELETE FROM import_staging")
+            self.conn.executemany(
+                "INSERT INTO import_staging (row_no, first_name, last_name, student_id, midterm, final, average) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                staging.itertuples(index=False, name=None)
+            )
+
+            duplicates = self.conn.execute('''
+                SELECT row_no FROM import_staging s
+                WHERE EXISTS (SELECT 1 FROM students t WHERE t.student_id = s.student_id)
+                   OR EXISTS (SELECT 1 FROM import_staging d WHERE d.student_id = s.student_id AND d.row_no < s.row_no)
+            ''').fetchall()
+            for (row_no,) in duplicates:
+                chunk_errors.append((row_no, f"ردیف {row_no}: شماره دانشجویی تکراری"))
+            self.conn.executemany("DELETE FROM import_staging WHERE row_no=?", duplicates)
+
+            cursor = self.conn.execute('''
+                INSERT INTO students (first_name, last_name, student_id, midterm, final, average, registration_date)
+                SELECT first_name, last_name, student_id, midterm, final, average, ?
+                FROM import_staging ORDER BY row_no
+            ''', (self.registration_date,))
+            self.success_count += cursor.rowcount
+
+            self.conn.execute("DELETE FROM import_staging")
+
+        self.add_errors(chunk_errors)
+
+    def text_column(self, df, column):
+        return df[column].fillna("").astype(str).str.strip()
+
+    def grade_column(self, df, column):
+        if column not in df.columns:
+            empty = pd.Series(float("nan"), index=df.index)
+            return empty, pd.Series(False, index=df.index)
+        # خانه خالی (None در xlsx یا رشته خالی در CSV) نمره ندارد و خطا نیست
+        values = df[column].replace(r"^\s*$", np.nan, regex=True)
+        grades = pd.to_numeric(values, errors="coerce")
+        return grades, grades.isna() & values.notna()
+
+
+class StudentExporter:
+    # ردیف‌ها دسته به دسته از cursor خوانده و بلافاصله در فایل نوشته می‌شوند
+    BATCH_SIZE = 5000
+    MAX_SHEET_ROWS = 1048575
+    HEADERS = STUDENT_TABLE_HEADERS + ["تاریخ ثبت"]
+    COLUMNS = STUDENT_TABLE_COLUMNS + ["registration_date"]
+
+    def __init__(self, conn, conditions="", params=()):
+        self.conn = conn
+        self.conditions = conditions
+        self.params = list(params)
+
+    def has_rows(self):
+        cursor = self.conn.execute("SELECT 1 FROM students WHERE 1=1" + self.conditions + " LIMIT 1", self.params)
+        return cursor.fetchone() is not None
+
+    def count(self):
+        cursor = self.conn.execute("SELECT COUNT(*) FROM students WHERE 1=1" + self.conditions, self.params)
+        return cursor.fetchone()[0]
+
+    def iter_batches(self):
+        cursor = self.conn.cursor()
+        cursor.execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM students WHERE 1=1" + self.conditions + " ORDER BY id",
+            self.params
+        )
+        while True:
+            rows = cursor.fetchmany(self.BATCH_SIZE)
+            if not rows:
+                break
+            yield rows
+
+    def export(self, file_path, progress=None):
+        if file_path.lower().endswith(".csv"):
+            return self.export_csv(file_path, progress)
+        return self.export_xlsx(file_path, progress)
+
+    def export_csv(self, file_path, progress=None):
+        written = 0
+        with open(file_path, "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(self.HEADERS)
+            for rows in self.iter_batches():
+                writer.writerows(rows)
+                written += len(rows)
+                if progress:
+                    progress(written)
+        return written
+
+    def export_xlsx(self, file_path, progress=None):
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = None
+        sheet_rows = 0
+        written = 0
+        for rows in self.iter_batches():
+            for row in rows:
+                if sheet is None or sheet_rows >= self.MAX_SHEET_ROWS:
+                    sheet = workbook.create_sheet(f"دانشجویان {len(workbook.worksheets) + 1}")
+                    sheet.append(self.HEADERS)
+                    sheet_rows = 0
+                sheet.append(row)
+                sheet_rows += 1
+            written += len(rows)
+            if progress:
+                progress(written)
+        if sheet is None:
+            workbook.create_sheet("دانشجویان 1").append(self.HEADERS)
+        workbook.save(file_path)
+        return written
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobSignals(QObject):
+    progress = pyqtSignal(int, int, float)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+
+class Job(QRunnable):
+    # عملیات طولانی در QThreadPool و با اتصال جداگانه به پایگاه داده اجرا می‌شود؛ تابع کار، خود Job را برای گزارش پیشرفت و بررسی لغو می‌گیرد
+    PROGRESS_INTERVAL = 0.1
+
+    def __init__(self, func, *args, open_connection=True, read_only=False):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.func = func
+        self.args = args
+        self.open_connection = open_connection
+        self.read_only = read_only
+        self.signals = JobSignals()
+        self.cancel_event = threading.Event()
+        self.last_report = 0
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+    def report(self, done, total, items=None):
+        self.check_cancelled()
+        now = time.perf_counter()
+        if now - self.last_report >= self.PROGRESS_INTERVAL or done >= total > 0:
+            self.last_report = now
+            self.signals.progress.emit(int(done), int(total), float(done if items is None else items))
+
+    def run(self):
+        conn = None
+        try:
+            if self.open_connection:
+                conn = open_connection(DATABASE_PATH, read_only=self.read_only)
+            with instrumentation.measure(self.func.__name__):
+                result = self.func(self, conn, *self.args)
+        except JobCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+        else:
+            self.signals.finished.emit(result)
+        finally:
+            if conn is not None:
+                conn.close()
+
+
+class JobProgressDialog(QDialog):
+    def __init__(self, parent, title, message, unit):
+        super().__init__(parent)
+        self.unit = unit
+        self.started = time.perf_counter()
+        self.setWindowTitle(title)
+        self.setMinimumWidth(350)
+        self.setLayoutDirection(Qt.RightToLeft)
+        self.setModal(True)
+        
+        layout = QVBoxLayout()
+        self.progress_label = QLabel(message)
+        layout.addWidget(self.progress_label)
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 0)
+        layout.addWidget(self.progress_bar)
+        self.rate_label = QLabel("")
+        layout.addWidget(self.rate_label)
+        self.cancel_button = QPushButton("لغو")
+        layout.addWidget(self.cancel_button)
+        self.setLayout(layout)
+
+    def update_progress(self, done, total, items):
+        if total > 0:
+            self.progress_bar.setRange(0, total)
+            self.progress_bar.setValue(min(done, total))
+        elapsed = time.perf_counter() - self.started
+        rate = items / elapsed if elapsed > 0 else 0
+        self.rate_label.setText(f"{items:,.0f} {self.unit} - {rate:,.0f} {self.unit} در ثانیه")
+
+    def reject(self):
+        self.cancel_button.click()
+
+    def closeEvent(self, event):
+        self.cancel_button.click()
+        event.ignore()
+
+
+class DiagnosticsDialog(QDialog):
+    LATENCY_HEADERS = ["تعداد", "p50 (ms)", "p95 (ms)", "p99 (ms)", "بیشینه (ms)"]
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.setWindowTitle("گزارش عملکرد")
+        self.setMinimumSize(900, 550)
+        self.setLayoutDirection(Qt.RightToLeft)
+
+        layout = QVBoxLayout()
+        self.summary_label = QLabel()
+        layout.addWidget(self.summary_label)
+        self.tabs = QTabWidget()
+        self.operations_table = self.create_table(["عملیات"] + self.LATENCY_HEADERS)
+        self.statements_table = self.create_table(["دستور"] + self.LATENCY_HEADERS)
+        self.slow_table = self.create_table(["زمان", "مدت (ms)", "رشته", "دستور", "پارامترها", "طرح اجرا"])
+        self.tabs.addTab(self.operations_table, "عملیات")
+        self.tabs.addTab(self.statements_table, "دستورات پایگاه داده")
+        self.tabs.addTab(self.slow_table, "پرس‌وجوهای کند")
+        layout.addWidget(self.tabs)
+
+        buttons_layout = QHBoxLayout()
+        for text, slot in (("بازخوانی", self.refresh), ("پاک کردن آمار", self.reset), ("ذخیره در فایل", self.export), ("بستن", self.accept)):
+            button = QPushButton(text)
+            button.clicked.connect(slot)
+            buttons_layout.addWidget(button)
+        layout.addLayout(buttons_layout)
+        self.setLayout(layout)
+        self.refresh()
+
+    def create_table(self, headers):
+        table = QTableWidget(0, len(headers))
+        table.setHorizontalHeaderLabels(headers)
+        table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        table.setWordWrap(False)
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        table.horizontalHeader().setStretchLastSection(True)
+        return table
+
+    def fill_table(self, table, rows):
+        table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(f"{value:.2f}" if isinstance(value, float) else str(value))
+                item.setToolTip(item.text())
+                table.setItem(row, column, item)
+
+    def latency_rows(self, items, name_key):
+        return [(item[name_key], item["count"], item["p50_ms"], item["p95_ms"], item["p99_ms"], item["max_ms"]) for item in items]
+
+    def refresh(self):
+        snapshot = instrumentation.snapshot()
+        self.summary_label.setText(
+            f"از {snapshot['started']}  -  آستانه پرس‌وجوی کند: {snapshot['slow_query_ms']:.0f} ms  -  "
+            f"{len(snapshot['slow_queries'])} پرس‌وجوی کند"
+        )
+        self.fill_table(self.operations_table, self.latency_rows(snapshot["operations"], "name"))
+        self.fill_table(self.statements_table, self.latency_rows(snapshot["statements"], "sql"))
+        self.fill_table(self.slow_table, [
+            (entry["time"], entry["elapsed_ms"], entry["thread"], entry["sql"], entry["params"], " | ".join(entry["plan"]))
+            for entry in snapshot["slow_queries"]
+        ])
+
+    def reset(self):
+        instrumentation.reset()
+        self.refresh()
+
+    def export(self):
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "ذخیره گزارش عملکرد", f"diagnostics_{timestamp}.json", "JSON files (*.json);;Text files (*.txt)"
+        )
+        if not file_path:
+            return
+        try:
+            instrumentation.export(file_path)
+            QMessageBox.information(self, "موفقیت", f"گزارش عملکرد ذخیره شد:\n{file_path}")
+        except Exception as e:
+            QMessageBox.critical(self, "خطا", f"خطا در ذخیره گزارش عملکرد: {str(e)}")
+
+
+def export_students_job(job, conn, file_path, conditions, params):
+    exporter = StudentExporter(conn, conditions, params)
+    total = exporter.count()
+    return exporter.export(file_path, lambda written: job.report(written, total))
+
+
+def import_students_job(job, conn, file_path, rank_policy):
+    importer = StudentImporter(conn)
+    importer.import_file(file_path, lambda processed_rows, done, total: job.report(done, total, processed_rows))
+    if importer.success_count:
+        rank_all_students(conn, rank_policy)
+    return importer
+
+
+def import_photos_job(job, conn, folder):
+    importer = PhotoImporter(conn)
+    importer.import_folder(folder, job.report)
+    return importer
+
+
+def maintain_photos_job(job, conn):
+    store = PhotoStore()
+    adopted = store.adopt_external(conn, job.report)
+    store.sweep(conn)
+    store.collect_garbage(conn)
+    return adopted
+
+
+def backup_database_job(job, conn, target_path):
+    # API پشتیبان‌گیری SQLite یک نسخه سازگار را صفحه به صفحه کپی می‌کند و برنامه در این مدت قابل استفاده می‌ماند؛ فایل نهایی تنها پس از اتمام جایگزین می‌شود
+    temp_path = target_path + ".tmp"
+    try:
+        target = sqlite3.connect(temp_path)
+        try:
+            conn.backup(target, pages=BACKUP_PAGES_PER_STEP,
+                        progress=lambda status, remaining, total: job.report(total - remaining, total))
+            target.execute("PRAGMA journal_mode = DELETE")
+        finally:
+            target.close()
+        os.replace(temp_path, target_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    store = PhotoStore()
+    store.sync(store.photo_paths(conn), "", os.path.dirname(os.path.abspath(target_path)), job.report)
+    return target_path
+
+
+def restore_database_job(job, conn, source_path):
+    restore_database_file(conn, source_path, job.report)
+    store = PhotoStore()
+    store.sync(store.photo_paths(conn), os.path.dirname(os.path.abspath(source_path)), "", job.report)
+    return source_path
+
+
+def restore_database_file(conn, source_path, progress):
+    # بازیابی در یک تراکنش روی پایگاه داده زنده انجام می‌شود؛ اگر لغو شود یا خطا دهد، داده‌های فعلی دست‌نخورده باقی می‌مانند
+    source = sqlite3.connect(f"file:{pathname2url(os.path.abspath(source_path))}?mode=ro", uri=True)
+    try:
+        check = source.execute("PRAGMA quick_check").fetchone()[0]
+        if check != "ok":
+            raise sqlite3.DatabaseError(f"فایل پشتیبان معتبر نیست: {check}")
+        source.backup(conn, pages=BACKUP_PAGES_PER_STEP,
+                      progress=lambda status, remaining, total: progress(total - remaining, total))
+    finally:
+        source.close()
+    return source_path
+
+
+class SnapshotStore:
+    # هر نسخه یک فهرست (manifest) از هش تکه‌های فایل پایگاه داده است؛ تکه‌ها با zlib فشرده و بر اساس sha256 در objects/ab/hash ذخیره می‌شوند
+    def __init__(self, root):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.manifests_dir = os.path.join(root, "manifests")
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def manifest_path(self, name):
+        return os.path.join(self.manifests_dir, f"{name}.json")
+
+    def snapshots(self):
+        if not os.path.isdir(self.manifests_dir):
+            return []
+        result = []
+        for file_name in sorted(os.listdir(self.manifests_dir), reverse=True):
+            if file_name.endswith(".json"):
+                result.append(self.load(file_name[:-5]))
+        return result
+
+    def load(self, name):
+        with open(self.manifest_path(name), encoding='utf-8') as f:
+            manifest = json.load(f)
+        manifest["name"] = name
+        return manifest
+
+    def write_atomic(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def store_object(self, digest, data):
+        path = self.object_path(digest)
+        if os.path.exists(path):
+            return False
+        self.write_atomic(path, zlib.compress(data, 6))
+        return True
+
+    def create(self, conn, progress=None):
+        # پیشرفت به صفحه است: نیمه اول کپی پایگاه داده و نیمه دوم هش و ذخیره تکه‌ها
+        os.makedirs(self.root, exist_ok=True)
+        now = datetime.datetime.now()
+        name = now.strftime("%Y%m%d_%H%M%S_%f")
+        temp_path = os.path.join(self.root, f"{name}.db.tmp")
+        try:
+            target = sqlite3.connect(temp_path)
+            try:
+                conn.backup(target, pages=BACKUP_PAGES_PER_STEP,
+                            progress=lambda status, remaining, total: progress and progress(total - remaining, 2 * total))
+                target.execute("PRAGMA journal_mode = DELETE")
+                check = target.execute("PRAGMA quick_check").fetchone()[0]
+                page_size = target.execute("PRAGMA page_size").fetchone()[0]
+                student_count = target.execute("SELECT COUNT(*) FROM students").fetchone()[0]
+                photo_paths = PhotoStore().photo_paths(target)
+            finally:
+                target.close()
+            if check != "ok":
+                raise sqlite3.DatabaseError(f"نسخه ایجادشده معتبر نیست: {check}")
+
+            size = os.path.getsize(temp_path)
+            page_count = size // page_size
+            chunks = []
+            stored_bytes = 0
+            with open(temp_path, "rb") as f:
+                while True:
+                    block = f.read(page_size * SNAPSHOT_CHUNK_PAGES)
+                    if not block:
+                        break
+                    digest = hashlib.sha256(block).hexdigest()
+                    if self.store_object(digest, block):
+                        stored_bytes += len(block)
+                    chunks.append(digest)
+                    if progress:
+                        progress(page_count + f.tell() // page_size, 2 * page_count)
+
+            photos = {}
+            for photo_path in photo_paths:
+                digest = PhotoStore.path_digest(photo_path)
+                if not os.path.exists(self.object_path(digest)) and os.path.isfile(photo_path):
+                    with open(photo_path, "rb") as f:
+                        data = f.read()
+                    if hashlib.sha256(data).hexdigest() != digest:
+                        continue
+                    self.store_object(digest, data)
+                    stored_bytes += len(data)
+                if os.path.exists(self.object_path(digest)):
+                    photos[photo_path] = digest
+
+            latest = self.snapshots()
+            if latest and latest[0]["chunks"] == chunks and latest[0].get("photos", {}) == photos:
+                return None
+            manifest = {
+                "created": now.strftime("%Y-%m-%d %H:%M:%S"),
+                "size": size,
+                "page_size": page_size,
+                "student_count": student_count,
+                "quick_check": check,
+                "stored_bytes": stored_bytes,
+                "chunks": chunks,
+                "photos": photos,
+            }
+            self.write_atomic(self.manifest_path(name), json.dumps(manifest).encode('utf-8'))
+            manifest["name"] = name
+            return manifest
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def rebuild(self, name, target_path, progress=None):
+        manifest = self.load(name)
+        chunks = manifest["chunks"]
+        page_count = manifest["size"] // manifest["page_size"]
+        with open(target_path, "wb") as f:
+            for digest in chunks:
+                with open(self.object_path(digest), "rb") as obj:
+                    block = zlib.decompress(obj.read())
+                if hashlib.sha256(block).hexdigest() != digest:
+                    raise sqlite3.DatabaseError(f"تکه {digest[:12]} از نسخه {name} خراب است")
+                f.write(block)
+                if progress:
+                    progress(f.tell() // manifest["page_size"], page_count)
+        return target_path
+
+    def restore_photos(self, name):
+        restored = 0
+        for photo_path, digest in self.load(name).get("photos", {}).items():
+            if not os.path.exists(photo_path):
+                with open(self.object_path(digest), "rb") as obj:
+                    data = zlib.decompress(obj.read())
+                if hashlib.sha256(data).hexdigest() != digest:
+                    raise sqlite3.DatabaseError(f"عکس {photo_path} در نسخه {name} خراب است")
+                self.write_atomic(photo_path, data)
+                restored += 1
+        return restored
+
+    def apply_retention(self, keep_last=SNAPSHOT_KEEP_LAST, keep_daily=SNAPSHOT_KEEP_DAILY):
+        # آخرین نسخه‌ها و آخرین نسخه هر روز (تا keep_daily روز) نگه داشته می‌شوند
+        snapshots = self.snapshots()
+        keep = {snapshot["name"] for snapshot in snapshots[:keep_last]}
+        days = set()
+        for snapshot in snapshots:
+            day = snapshot["created"][:10]
+            if day not in days and len(days) < keep_daily:
+                days.add(day)
+                keep.add(snapshot["name"])
+        removed = 0
+        for snapshot in snapshots:
+            if snapshot["name"] not in keep:
+                os.remove(self.manifest_path(snapshot["name"]))
+                removed += 1
+        if removed:
+            self.collect_garbage()
+        return removed
+
+    def collect_garbage(self):
+        referenced = set()
+        for snapshot in self.snapshots():
+            referenced.update(snapshot["chunks"])
+            referenced.update(snapshot.get("photos", {}).values())
+        for dir_path, _, file_names in os.walk(self.objects_dir):
+            for file_name in file_names:
+                if file_name not in referenced:
+                    os.remove(os.path.join(dir_path, file_name))
+
+
+def create_snapshot_job(job, conn, store):
+    manifest = store.create(conn, job.report)
+    store.apply_retention()
+    return manifest
+
+
+def restore_snapshot_job(job, conn, store, name):
+    temp_path = os.path.join(store.root, f"restore_{name}.db.tmp")
+    try:
+        # مانند ایجاد نسخه، پیشرفت به صفحه است: نیمه اول بازسازی فایل و نیمه دوم بازیابی روی پایگاه داده
+        store.rebuild(name, temp_path, lambda done, total: job.report(done, 2 * total))
+        restore_database_file(conn, temp_path, lambda done, total: job.report(total + done, 2 * total))
+        store.restore_photos(name)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return name
+
+
+class SnapshotDialog(QDialog):
+    def __init__(self, parent, snapshots):
+        super().__init__(parent)
+        self.setWindowTitle("بازیابی از نسخه‌های خودکار")
+        self.setMinimumSize(500, 350)
+        self.setLayoutDirection(Qt.RightToLeft)
+
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel("نسخه مورد نظر را انتخاب کنید:"))
+        self.snapshot_list = QListWidget()
+        for snapshot in snapshots:
+            item = QListWidgetItem(f"{snapshot['created']}  -  {snapshot['student_count']} دانشجو  -  {snapshot['size'] / 1048576:.1f} مگابایت")
+            item.setData(Qt.UserRole, snapshot["name"])
+            self.snapshot_list.addItem(item)
+        self.snapshot_list.setCurrentRow(0)
+        self.snapshot_list.itemDoubleClicked.connect(self.accept)
+        layout.addWidget(self.snapshot_list)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+        self.setLayout(layout)
+
+    def selected_name(self):
+        item = self.snapshot_list.currentItem()
+        return item.data(Qt.UserRole) if item else None
+
+
+def report_rows(cursor, batch_size=StudentExporter.BATCH_SIZE):
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield from rows
+
+
+class ReportSummary:
+    # آمار پایانی در همان گذر اصلی جمع می‌شود؛ ستون اول هر ردیف معدل عددی است و بقیه خانه‌های متنی گزارش‌اند
+    def __init__(self):
+        self.count = 0
+        self.average_sum = 0
+        self.average_count = 0
+        self.max_average = 0
+        self.excellent_count = 0
+
+    def track(self, rows):
+        for row in rows:
+            self.count += 1
+            average = row[0]
+            if average is not None:
+                self.average_sum += average
+                self.average_count += 1
+                if average > self.max_average:
+                    self.max_average = average
+                if average >= EXCELLENT_AVERAGE:
+                    self.excellent_count += 1
+            yield row[1:]
+
+    def items(self):
+        average = self.average_sum / self.average_count if self.average_count else 0
+        return [
+            ("تعداد کل دانشجویان", str(self.count)),
+            ("میانگین معدل", f"{average:.2f}"),
+            ("بالاترین معدل", f"{self.max_average:.2f}"),
+            ("تعداد دانشجویان ممتاز", str(self.excellent_count)),
+        ]
+
+
+def paginate(rows, page_size):
+    rows = iter(rows)
+    while True:
+        page = list(islice(rows, page_size))
+        if not page:
+            break
+        yield page
+
+
+class ReportRenderer:
+    # هر قالب گزارش صفحه به صفحه می‌نویسد؛ آمار پایانی پس از آخرین صفحه و در صورت جا داشتن روی همان صفحه قرار می‌گیرد
+    TITLE = "گزارش دانشجویان"
+    SUMMARY_TITLE = "آمار پایانی"
+    HEADERS = ["ردیف", "نام", "نام خانوادگی", "شماره دانشجویی", "میانترم", "پایان‌ترم", "معدل", "رتبه"]
+    ROWS_PER_PAGE = 50
+    SUMMARY_ROWS = 0
+
+    def __init__(self, file_path, created):
+        self.file_path = file_path
+        self.created = created
+        self.rows_per_page = self.ROWS_PER_PAGE
+
+    def page_count(self, total):
+        return max(1, -(-(total + self.SUMMARY_ROWS) // self.rows_per_page))
+
+
+class TextReportRenderer(ReportRenderer):
+    WIDTHS = [5, 15, 20, 15, 10, 10, 10, 10]
+    ROWS_PER_PAGE = 60
+
+    def __init__(self, file_path, created):
+        super().__init__(file_path, created)
+        self.line_format = "".join(f"{{:<{width}}}" for width in self.WIDTHS) + "\n"
+        self.file = open(file_path, 'w', encoding='utf-8')
+        self.file.write("="*50 + "\n")
+        self.file.write(self.TITLE.center(50) + "\n")
+        self.file.write("="*50 + "\n\n")
+        self.file.write(f"تاریخ گزارش: {created}\n\n")
+
+    def page(self, number, page_count, rows):
+        if number > 1:
+            self.file.write("\f")
+        self.file.write(f"صفحه {number} از {page_count}\n")
+        self.file.write(self.line_format.format(*self.HEADERS))
+        self.file.write("-"*95 + "\n")
+        line_format = self.line_format
+        self.file.writelines(line_format.format(*row) for row in rows)
+
+    def finish(self, summary):
+        self.file.write("\n" + "="*50 + "\n")
+        self.file.write(self.SUMMARY_TITLE.center(50) + "\n")
+        self.file.write("="*50 + "\n\n")
+        for label, value in summary.items():
+            self.file.write(f"{label}: {value}\n")
+
+    def close(self):
+        self.file.close()
+
+
+class HtmlReportRenderer(ReportRenderer):
+    STYLE = """
+body { font-family: 'B Nazanin', Tahoma, sans-serif; font-size: 12px; margin: 24px; }
+h1, h2 { text-align: center; }
+table { width: 100%; border-collapse: collapse; margin-bottom: 12px; }
+th, td { border: 1px solid #bdc3c7; padding: 3px 6px; text-align: right; }
+th { background: #ecf0f1; }
+.page-number { color: #7f8c8d; text-align: left; margin: 8px 0 4px; }
+.summary table { width: auto; }
+@media print { section.page { page-break-after: always; } }
+"""
+
+    def __init__(self, file_path, created):
+        super().__init__(file_path, created)
+        self.file = open(file_path, 'w', encoding='utf-8')
+        self.file.write(f'<!DOCTYPE html>\n<html lang="fa" dir="rtl">\n<head>\n<meta charset="utf-8">\n'
+                        f'<title>{self.TITLE}</title>\n<style>{self.STYLE}</style>\n</head>\n<body>\n'
+                        f'<h1>{self.TITLE}</h1>\n<p>تاریخ گزارش: <span dir="ltr">{created}</span></p>\n')
+        self.header = "".join(f"<th>{html.escape(header)}</th>" for header in self.HEADERS)
+
+    def page(self, number, page_count, rows):
+        self.file.write(f'<section class="page">\n<p class="page-number">صفحه {number} از {page_count}</p>\n'
+                        f'<table>\n<thead><tr>{self.header}</tr></thead>\n<tbody>\n')
+        self.file.writelines(
+            "<tr>" + "".join(f"<td>{html.escape(cell)}</td>" for cell in row) + "</tr>\n"
+            for row in rows
+        )
+        self.file.write("</tbody>\n</table>\n</section>\n")
+
+    def finish(self, summary):
+        self.file.write(f'<section class="summary">\n<h2>{self.SUMMARY_TITLE}</h2>\n<table>\n')
+        for label, value in summary.items():
+            self.file.write(f"<tr><th>{label}</th><td>{value}</td></tr>\n")
+        self.file.write("</table>\n</section>\n</body>\n</html>\n")
+
+    def close(self):
+        self.file.close()
+
+
+class PdfReportRenderer(ReportRenderer):
+    # هر ستون یک صفحه با یک فراخوانی drawText چندخطی رسم می‌شود تا گزارش‌های بسیار بزرگ هم سریع ساخته شوند
+    FONT_FAMILY = 'B Nazanin'
+    FONT_SIZE = 9
+    RESOLUTION = 150
+    MARGIN_MM = 12
+    WIDTHS = [7, 15, 19, 16, 11, 11, 10, 11]
+    HEADER_ROWS = 3
+    SUMMARY_ROWS = 7
+
+    def __init__(self, file_path, created):
+        super().__init__(file_path, created)
+        self.writer = QPdfWriter(file_path)
+        self.writer.setResolution(self.RESOLUTION)
+        self.writer.setPageSize(QPageSize(QPageSize.A4))
+        self.writer.setPageMargins(QMarginsF(*[self.MARGIN_MM] * 4), QPageLayout.Millimeter)
+        self.writer.setTitle(self.TITLE)
+        self.painter = QPainter(self.writer)
+        self.font = QFont(self.FONT_FAMILY, self.FONT_SIZE)
+        self.bold_font = QFont(self.FONT_FAMILY, self.FONT_SIZE, QFont.Bold)
+        self.painter.setFont(self.font)
+        self.width = self.writer.width()
+        self.line_height = self.painter.fontMetrics().lineSpacing()
+        self.rows_per_page = self.writer.height() // self.line_height - self.HEADER_ROWS
+        # ستون اول در سمت راست صفحه قرار می‌گیرد؛ هر خانه از سمت راست کمی فاصله دارد
+        padding = self.line_height / 2
+        self.columns = []
+        right = self.width
+        for width in self.WIDTHS:
+            column_width = self.width * width / sum(self.WIDTHS)
+            self.columns.append((right - column_width, column_width - padding))
+            right -= column_width
+        self.pages = 0
+        self.used_rows = 0
+
+    def start_page(self, number, page_count):
+        if self.pages:
+            self.writer.newPage()
+        self.pages += 1
+        painter = self.painter
+        painter.setFont(self.bold_font)
+        painter.drawText(QRectF(0, 0, self.width, self.line_height), Qt.AlignRight | Qt.AlignVCenter, self.TITLE)
+        painter.setFont(self.font)
+        painter.drawText(QRectF(0, 0, self.width, self.line_height), Qt.AlignHCenter | Qt.AlignVCenter, f"تاریخ گزارش: \u202a{self.created}\u202c")
+        painter.drawText(QRectF(0, 0, self.width, self.line_height), Qt.AlignLeft | Qt.AlignVCenter, f"صفحه {number} از {page_count}")
+        top = self.line_height * 1.5
+        painter.setFont(self.bold_font)
+        for (x, width), header in zip(self.columns, self.HEADERS):
+            painter.drawText(QRectF(x, top, width, self.line_height), Qt.AlignRight | Qt.AlignVCenter, header)
+        painter.setFont(self.font)
+        painter.drawLine(QPointF(0, top + self.line_height), QPointF(self.width, top + self.line_height))
+        self.used_rows = 0
+
+    def page(self, number, page_count, rows):
+        self.start_page(number, page_count)
+        top = self.line_height * self.HEADER_ROWS
+        height = self.line_height * len(rows)
+        for i, (x, width) in enumerate(self.columns):
+            self.painter.drawText(QRectF(x, top, width, height), Qt.AlignRight | Qt.AlignTop, "\n".join(row[i] for row in rows))
+        self.used_rows = len(rows)
+
+    def finish(self, summary):
+        if not self.pages or self.used_rows + self.SUMMARY_ROWS > self.rows_per_page:
+            self.start_page(self.pages + 1, self.pages + 1)
+        painter = self.painter
+        top = self.line_height * (self.HEADER_ROWS + self.used_rows + 1)
+        painter.drawLine(QPointF(0, top), QPointF(self.width, top))
+        painter.setFont(self.bold_font)
+        painter.drawText(QRectF(0, top, self.width, self.line_height * 1.5), Qt.AlignHCenter | Qt.AlignVCenter, self.SUMMARY_TITLE)
+        painter.setFont(self.font)
+        top += self.line_height * 2
+        for label, value in summary.items():
+            painter.drawText(QRectF(0, top, self.width, self.line_height), Qt.AlignRight | Qt.AlignVCenter, f"{label}: {value}")
+            top += self.line_height
+
+    def close(self):
+        self.painter.end()
+
+
+REPORT_RENDERERS = {
+    ".txt": TextReportRenderer,
+    ".html": HtmlReportRenderer,
+    ".htm": HtmlReportRenderer,
+    ".pdf": PdfReportRenderer,
+}
+
+
+def write_report_job(job, conn, file_path):
+    # ردیف‌ها از cursor به صورت جریانی از خلاصه‌ساز و صفحه‌بند عبور می‌کنند؛ حافظه مستقل از تعداد دانشجویان است
+    renderer_class = REPORT_RENDERERS.get(os.path.splitext(file_path)[1].lower(), TextReportRenderer)
+    # تعداد کل و ردیف‌ها از یک تراکنش خواندنی می‌آیند تا شماره صفحه‌ها با محتوا یکی باشد
+    conn.execute("BEGIN")
+    try:
+        total = conn.execute("SELECT student_count FROM student_stats WHERE id = 1").fetchone()[0]
+        # خانه‌های گزارش در خود SQLite به متن تبدیل می‌شوند
+        cells = ", ".join(f"IFNULL(CAST({column} AS TEXT), '-')" for column in STUDENT_TABLE_COLUMNS)
+        cursor = conn.execute(f"SELECT average, {cells} FROM students ORDER BY id")
+        renderer = renderer_class(file_path, datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        try:
+            page_count = renderer.page_count(total)
+            summary = ReportSummary()
+            for number, rows in enumerate(paginate(summary.track(report_rows(cursor)), renderer.rows_per_page), 1):
+                renderer.page(number, page_count, rows)
+                job.report(summary.count, total)
+            renderer.finish(summary)
+        finally:
+            renderer.close()
+    finally:
+        conn.rollback()
+    return file_path
+
+
+def transcript_file_name(student_id):
+    # شماره‌های متفاوت ممکن است پس از پاک‌سازی نویسه‌ها (یا در سیستم فایل بی‌توجه به بزرگی حروف) یکسان شوند؛ هش شماره اصلی نام فایل را یکتا می‌کند
+    safe_name = "".join(c if c.isalnum() or c in "-_" else "_" for c in student_id)
+    return f"{safe_name}_{hashlib.sha256(student_id.encode()).hexdigest()[:8]}.html"
+
+
+def transcript_digest(student):
+    return hashlib.sha256(repr(tuple(student)).encode()).hexdigest()[:16]
+
+
+def transcript_photo(photo_path, size=TRANSCRIPT_PHOTO_SIZE):
+    reader = QImageReader(photo_path)
+    reader.setAutoTransform(True)
+    source_size = reader.size()
+    if source_size.isValid():
+        reader.setScaledSize(source_size.scaled(size, size, Qt.KeepAspectRatio))
+    image = reader.read()
+    if image.isNull():
+        return None
+    buffer = QBuffer()
+    buffer.open(QIODevice.WriteOnly)
+    image.convertToFormat(QImage.Format_RGB32).save(buffer, "JPG", 85)
+    return base64.b64encode(bytes(buffer.data())).decode('ascii')
+
+
+TRANSCRIPT_STYLE = """
+body { font-family: 'B Nazanin', Tahoma, sans-serif; font-size: 14px; max-width: 640px; margin: 32px auto; }
+h1 { text-align: center; }
+.photo { text-align: center; margin-bottom: 16px; }
+.photo img { border: 1px solid #bdc3c7; }
+table { width: 100%; border-collapse: collapse; }
+th, td { border: 1px solid #bdc3c7; padding: 6px 10px; text-align: right; }
+th { background: #ecf0f1; width: 40%; }
+.created { color: #7f8c8d; margin-top: 16px; }
+"""
+
+
+def transcript_html(student, photo, created):
+    first_name, last_name, student_id = (html.escape(value) for value in student[1:4])
+    fields = [
+        ("نام", first_name),
+        ("نام خانوادگی", last_name),
+        ("شماره دانشجویی", student_id),
+        ("نمره میانترم", student[4] if student[4] is not None else "ثبت نشده"),
+        ("نمره پایان‌ترم", student[5] if student[5] is not None else "ثبت نشده"),
+        ("معدل", student[6] if student[6] is not None else "محاسبه نشده"),
+        ("رتبه", student[7] if student[7] is not None else "رتبه‌بندی نشده"),
+        ("تاریخ ثبت", html.escape(student[8]) if student[8] else "ثبت نشده"),
+    ]
+    rows = "".join(f"<tr><th>{label}</th><td>{value}</td></tr>\n" for label, value in fields)
+    photo_html = f'<img src="data:image/jpeg;base64,{photo}" alt="">' if photo else '<p>عکسی ثبت نشده است</p>'
+    return (f'<!DOCTYPE html>\n<html lang="fa" dir="rtl">\n<head>\n<meta charset="utf-8">\n'
+            f'<title>کارنامه {first_name} {last_name}</title>\n<style>{TRANSCRIPT_STYLE}</style>\n</head>\n<body>\n'
+            f'<h1>کارنامه دانشجو</h1>\n<div class="photo">{photo_html}</div>\n<table>\n{rows}</table>\n'
+            f'<p class="created">تاریخ صدور: <span dir="ltr">{created}</span></p>\n</body>\n</html>\n')
+
+
+def write_transcripts(students, folder, created):
+    # در پردازه‌های فرزند اجرا می‌شود؛ هر فایل ابتدا موقت نوشته و سپس جایگزین می‌شود تا کارنامه نیمه‌کاره باقی نماند
+    written = []
+    failed = []
+    for student in students:
+        file_name = transcript_file_name(student[3])
+        path = os.path.join(folder, file_name)
+        try:
+            photo = transcript_photo(student[9]) if student[9] and os.path.exists(student[9]) else None
+            temp_path = path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(transcript_html(student, photo, created))
+            os.replace(temp_path, path)
+            written.append((file_name, transcript_digest(student)))
+        except Exception as e:
+            failed.append(f"{student[3]}: {str(e)}")
+    return written, failed
+
+
+class TranscriptWriter:
+    # کارنامه‌ها دسته به دسته در پردازه‌های جداگانه ساخته می‌شوند؛ تعداد دسته‌های در جریان محدود است و کارنامه‌هایی که داده‌شان از آخرین ساخت تغییر نکرده دوباره ساخته نمی‌شوند
+    BATCH_SIZE = 100
+    IN_FLIGHT_PER_WORKER = 2
+    COLUMNS = STUDENT_TABLE_COLUMNS + ["registration_date", "photo_path"]
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.written_count = 0
+        self.skipped_count = 0
+        self.failed = []
+        self.index = {}
+
+    def read_index(self, folder):
+        # هر دسته تکمیل‌شده به انتهای فهرست افزوده می‌شود و آخرین سطر هر فایل معتبر است؛ فایل‌های حذف‌شده دوباره ساخته می‌شوند
+        index = {}
+        path = os.path.join(folder, TRANSCRIPT_INDEX)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    file_name, _, digest = line.rstrip("\n").partition("\t")
+                    index[file_name] = digest
+        existing = {entry.name for entry in os.scandir(folder) if entry.name.endswith(".html")}
+        return {file_name: digest for file_name, digest in index.items() if file_name in existing}
+
+    def write_index(self, folder):
+        path = os.path.join(folder, TRANSCRIPT_INDEX)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.writelines(f"{file_name}\t{digest}\n" for file_name, digest in self.index.items())
+        os.replace(path + ".tmp", path)
+
+    def iter_batches(self):
+        cursor = self.conn.execute(f"SELECT {', '.join(self.COLUMNS)} FROM students ORDER BY id")
+        while True:
+            students = cursor.fetchmany(self.BATCH_SIZE)
+            if not students:
+                break
+            yield students
+
+    def collect(self, futures, index_file, total, progress):
+        for future in futures:
+            written, failed = future.result()
+            self.written_count += len(written)
+            self.failed.extend(failed)
+            self.index.update(written)
+            index_file.writelines(f"{file_name}\t{digest}\n" for file_name, digest in written)
+        index_file.flush()
+        if progress:
+            progress(self.written_count + self.skipped_count + len(self.failed), total, self.written_count)
+
+    def write_all(self, folder, progress=None):
+        self.index = self.read_index(folder)
+        total = self.conn.execute("SELECT student_count FROM student_stats WHERE id = 1").fetchone()[0]
+        created = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        workers = os.cpu_count()
+        pending = set()
+        context = multiprocessing.get_context("spawn")
+        with open(os.path.join(folder, TRANSCRIPT_INDEX), "a", encoding="utf-8") as index_file, \
+                ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_photo_worker) as executor:
+            try:
+                for batch in self.iter_batches():
+                    students = [student for student in batch
+                                if self.index.get(transcript_file_name(student[3])) != transcript_digest(student)]
+                    self.skipped_count += len(batch) - len(students)
+                    if students:
+                        pending.add(executor.submit(write_transcripts, students, folder, created))
+                    while len(pending) >= workers * self.IN_FLIGHT_PER_WORKER:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        self.collect(done, index_file, total, progress)
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    self.collect(done, index_file, total, progress)
+                if progress:
+                    progress(total, total, self.written_count)
+            except BaseException:
+                executor.shutdown(wait=True, cancel_futures=True)
+                raise
+        # فهرست پس از اجرای کامل فشرده می‌شود تا سطرهای تکراری اجراهای قبلی انباشته نشوند
+        self.write_index(folder)
+
+
+def write_transcripts_job(job, conn, folder):
+    writer = TranscriptWriter(conn)
+    writer.write_all(folder, job.report)
+    return writer
+
+
+def figure_to_image(figure):
+    # رسم خارج از صفحه با Agg؛ نتیجه یک QImage مستقل است و در هر رشته‌ای ساخته می‌شود
+    canvas = FigureCanvasAgg(figure)
+    canvas.draw()
+    width, height = canvas.get_width_height()
+    return QImage(canvas.buffer_rgba(), width, height, QImage.Format_RGBA8888).copy()
+
+
+@measured("render_histogram")
+def render_histogram(counts):
+    figure = Figure(figsize=(10, 6), dpi=100)
+    ax = figure.add_subplot(111)
+    width = MAX_GRADE / HISTOGRAM_BINS
+    ax.bar([i * width for i in range(len(counts))], counts, width=width, align='edge',
+           color='#3498db', edgecolor='black', alpha=0.7)
+    ax.set_xlim(0, MAX_GRADE)
+    ax.set_title('توزیع معدل دانشجویان', fontname='B Nazanin', fontsize=16)
+    ax.set_xlabel('معدل', fontname='B Nazanin', fontsize=12)
+    ax.set_ylabel('تعداد دانشجویان', fontname='B Nazanin', fontsize=12)
+    ax.grid(True, linestyle='--', alpha=0.7)
+    return figure_to_image(figure)
+
+
+def grade_density(conn):
+    grid = np.zeros((DENSITY_BINS, DENSITY_BINS), dtype=np.int64)
+    rows = conn.execute("SELECT midterm_bin, final_bin, student_count FROM grade_density WHERE student_count > 0").fetchall()
+    if rows:
+        cells = np.array(rows, dtype=np.int64)
+        grid[cells[:, 0], cells[:, 1]] = cells[:, 2]
+    return grid
+
+
+def enrollment_counts(conn):
+    rows = conn.execute("""
+        SELECT day, student_count FROM enrollment_daily
+        WHERE student_count > 0 AND day GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]' ORDER BY day
+    """).fetchall()
+    days = np.array([row[0] for row in rows], dtype='datetime64[D]')
+    counts = np.array([row[1] for row in rows], dtype=np.int64)
+    return days, counts
+
+
+def downsample(x, y, max_points=ANALYTICS_MAX_POINTS):
+    # سطح جزئیات: برای منحنی صعودی تجمعی، نمونه‌برداری یکنواخت با حفظ دو سر کافی است
+    if len(x) <= max_points:
+        return x, y
+    indexes = np.unique(np.linspace(0, len(x) - 1, max_points).round().astype(np.int64))
+    return x[indexes], y[indexes]
+
+
+def histogram_box_stats(counts, label):
+    # چارک‌ها از توزیع تجمعی بازه‌ها با درون‌یابی خطی داخل هر بازه تخمین زده می‌شوند
+    width = MAX_GRADE / len(counts)
+    cumulative = np.cumsum(counts)
+    total = cumulative[-1]
+
+    def quantile(q):
+        target = q * total
+        index = min(int(np.searchsorted(cumulative, target)), len(counts) - 1)
+        before = cumulative[index - 1] if index else 0
+        return width * (index + (target - before) / counts[index] if counts[index] else index)
+
+    nonzero = np.nonzero(counts)[0]
+    low, high = nonzero[0] * width, (nonzero[-1] + 1) * width
+    q1, median, q3 = quantile(0.25), quantile(0.5), quantile(0.75)
+    iqr = q3 - q1
+    return {
+        "label": label, "med": median, "q1": q1, "q3": q3,
+        "whislo": max(low, q1 - 1.5 * iqr), "whishi": min(high, q3 + 1.5 * iqr), "fliers": [],
+    }
+
+
+def render_density(grid):
+    figure = Figure(figsize=(8, 6), dpi=100)
+    ax = figure.add_subplot(111)
+    edges = np.linspace(0, MAX_GRADE, DENSITY_BINS + 1)
+    # LogNorm برای شبکه‌ای که همه خانه‌هایش صفر است (پایگاه داده خالی) خطا می‌دهد؛ در این حالت فقط محورها رسم می‌شوند
+    if grid.any():
+        mesh = ax.pcolormesh(edges, edges, np.ma.masked_equal(grid.T, 0), cmap='viridis', norm=LogNorm())
+        figure.colorbar(mesh, ax=ax, label='تعداد دانشجویان')
+    ax.set_xlim(0, MAX_GRADE)
+    ax.set_ylim(0, MAX_GRADE)
+    ax.set_title('چگالی نمره میانترم و پایان‌ترم', fontname='B Nazanin', fontsize=16)
+    ax.set_xlabel('نمره میانترم', fontname='B Nazanin', fontsize=12)
+    ax.set_ylabel('نمره پایان‌ترم', fontname='B Nazanin', fontsize=12)
+    return figure_to_image(figure)
+
+
+def render_grade_bands(grid):
+    figure = Figure(figsize=(8, 6), dpi=100)
+    ax = figure.add_subplot(111)
+    band_size = DENSITY_BINS // GRADE_BANDS
+    band_width = MAX_GRADE / GRADE_BANDS
+    stats = []
+    for band in range(GRADE_BANDS):
+        counts = grid[band * band_size:(band + 1) * band_size].sum(axis=0)
+        if counts.any():
+            label = f"{band * band_width:g}-{(band + 1) * band_width:g}"
+            stats.append(histogram_box_stats(counts, label))
+    if stats:
+        ax.bxp(stats, showfliers=False, patch_artist=True, boxprops={'facecolor': '#3498db', 'alpha': 0.7})
+    ax.set_title('نمره پایان‌ترم بر حسب بازه نمره میانترم', fontname='B Nazanin', fontsize=16)
+    ax.set_xlabel('بازه نمره میانترم', fontname='B Nazanin', fontsize=12)
+    ax.set_ylabel('نمره پایان‌ترم', fontname='B Nazanin', fontsize=12)
+    ax.grid(True, linestyle='--', alpha=0.7)
+    return figure_to_image(figure)
+
+
+def render_enrollment(days, counts):
+    figure = Figure(figsize=(8, 6), dpi=100)
+    ax = figure.add_subplot(111)
+    if len(days):
+        x, y = downsample(days, np.cumsum(counts))
+        ax.plot(x, y, color='#2ecc71', linewidth=2)
+        figure.autofmt_xdate()
+    ax.set_title('روند ثبت‌نام دانشجویان', fontname='B Nazanin', fontsize=16)
+    ax.set_xlabel('تاریخ ثبت', fontname='B Nazanin', fontsize=12)
+    ax.set_ylabel('تعداد کل دانشجویان', fontname='B Nazanin', fontsize=12)
+    ax.grid(True, linestyle='--', alpha=0.7)
+    return figure_to_image(figure)
+
+
+ANALYTICS_CHARTS = [
+    ("density", "میانترم و پایان‌ترم"),
+    ("bands", "بازه‌های نمره"),
+    ("enrollment", "روند ثبت‌نام"),
+]
+
+
+def build_analytics_job(job, conn):
+    grid = grade_density(conn)
+    job.report(1, 3)
+    days, counts = enrollment_counts(conn)
+    job.report(2, 3)
+    return {
+        "density": render_density(grid),
+        "bands": render_grade_bands(grid),
+        "enrollment": render_enrollment(days, counts),
+    }
+
+
+class FigureCache:
+    # تصویر رسم‌شده هر نمودار با کلیدی از داده‌های آن نگه داشته می‌شود؛ تا داده تغییر نکند، باز کردن دوباره نمودار هزینه‌ای ندارد
+    def __init__(self, capacity=8):
+        self.capacity = capacity
+        self.items = OrderedDict()
+
+    def get(self, key):
+        pixmap = self.items.get(key)
+        if pixmap is not None:
+            self.items.move_to_end(key)
+        return pixmap
+
+    def put(self, key, image):
+        pixmap = QPixmap.fromImage(image)
+        self.items[key] = pixmap
+        while len(self.items) > self.capacity:
+            self.items.popitem(last=False)
+        return pixmap
+
+    def get_or_render(self, key, render, *args):
+        pixmap = self.get(key)
+        if pixmap is None:
+            pixmap = self.put(key, render(*args))
+        return pixmap
+
+
+class ThumbnailSignals(QObject):
+    loaded = pyqtSignal(QImage)
+
+
+class ThumbnailTask(QRunnable):
+    def __init__(self, path, size, cache_path):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.path = path
+        self.size = size
+        self.cache_path = cache_path
+        self.signals = ThumbnailSignals()
+
+    def run(self):
+        image = QImage()
+        try:
+            if os.path.exists(self.cache_path):
+                image = QImage(self.cache_path)
+            if image.isNull():
+                # QImageReader تصویر را هنگام رمزگشایی کوچک می‌کند و کل عکس با وضوح کامل در حافظه باز نمی‌شود
+                reader = QImageReader(self.path)
+                reader.setAutoTransform(True)
+                source_size = reader.size()
+                if source_size.isValid() and (source_size.width() > self.size or source_size.height() > self.size):
+                    reader.setScaledSize(source_size.scaled(self.size, self.size, Qt.KeepAspectRatio))
+                image = reader.read()
+                if not image.isNull():
+                    os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+                    temp_path = self.cache_path + ".tmp"
+                    if image.save(temp_path, "JPG", 85):
+                        os.replace(temp_path, self.cache_path)
+        except OSError:
+            pass
+        finally:
+            self.signals.loaded.emit(image)
+
+
+class ThumbnailCache(QObject):
+    # بندانگشتی‌ها بر اساس مسیر، زمان تغییر و حجم فایل یک بار ساخته و روی دیسک ذخیره می‌شوند؛ پرکاربردترین‌ها در یک LRU در حافظه می‌مانند
+    thumbnail_ready = pyqtSignal(str, int, QPixmap)
+
+    def __init__(self, cache_dir=THUMBNAIL_DIR, capacity=THUMBNAIL_MEMORY_ITEMS, parent=None):
+        super().__init__(parent)
+        self.cache_dir = cache_dir
+        self.capacity = capacity
+        self.memory = OrderedDict()
+        self.pending = {}
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(THUMBNAIL_THREADS)
+
+    def key(self, path, size):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, size)
+
+    def disk_path(self, key):
+        digest = hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.jpg")
+
+    def pixmap(self, path, size):
+        # QPixmap آماده، QPixmap خالی برای فایل ناموجود، یا None اگر بندانگشتی در حال ساخت است (پس از آن thumbnail_ready منتشر می‌شود)
+        key = self.key(path, size)
+        if key is None:
+            return QPixmap()
+        pixmap = self.memory.get(key)
+        if pixmap is not None:
+            self.memory.move_to_end(key)
+            return pixmap
+        if key not in self.pending:
+            task = ThumbnailTask(path, size, self.disk_path(key))
+            task.signals.loaded.connect(lambda image, key=key, path=path: self.store(key, path, image))
+            self.pending[key] = task
+            self.pool.start(task)
+        return None
+
+    def store(self, key, path, image):
+        self.pending.pop(key, None)
+        pixmap = QPixmap.fromImage(image)
+        if not pixmap.isNull():
+            self.memory[key] = pixmap
+            while len(self.memory) > self.capacity:
+                self.memory.popitem(last=False)
+        self.thumbnail_ready.emit(path, key[3], pixmap)
+
+
+class PhotoLabel(QLabel):
+    def __init__(self, cache, size, show_empty):
+        super().__init__()
+        self.cache = cache
+        self.thumb_size = size
+        self.show_empty = show_empty
+        self.path = ""
+        self.setAlignment(Qt.AlignCenter)
+        cache.thumbnail_ready.connect(self.thumbnail_ready)
+
+    def set_photo(self, path):
+        self.path = path or ""
+        if not self.path:
+            self.show_empty()
+            return
+        pixmap = self.cache.pixmap(self.path, self.thumb_size)
+        if pixmap is None:
+            self.setText("در حال بارگذاری عکس...")
+        else:
+            self.show_pixmap(pixmap)
+
+    @pyqtSlot(str, int, QPixmap)
+    def thumbnail_ready(self, path, size, pixmap):
+        if path == self.path and size == self.thumb_size:
+            self.show_pixmap(pixmap)
+
+    def show_pixmap(self, pixmap):
+        if pixmap.isNull():
+            self.show_empty()
+        else:
+            self.setPixmap(pixmap)
+
+
 class StudentManagementSystem(QMainWindow):
+    search_requested = pyqtSignal(int, str, list, int, int)
+    
     def __init__(self):
         super().__init__()
+        self.thumbnails = ThumbnailCache(parent=self)
+        self.figures = FigureCache()
         self.initUI()
         self.create_database()
+        self.start_search_worker()
+        self.start_snapshot_scheduler()
+        self.start_change_tracking()
+        self.maintain_photos()
+        self.student_events = StudentEvents(self)
+        self.student_events.students_changed.connect(self.show_student_changes)
         self.load_students()
         self.update_dashboard()
         
@@ -94,6 +3009,10 @@ class StudentManagementSystem(QMainWindow):
         import_excel_action.triggered.connect(self.import_from_excel)
         file_menu.addAction(import_excel_action)
         
+        import_photos_action = QAction("وارد کردن عکس‌ها از پوشه", self)
+        import_photos_action.triggered.connect(self.import_photos)
+        file_menu.addAction(import_photos_action)
+        
         file_menu.addSeparator()
         
         backup_action = QAction("پشتیبان‌گیری", self)
@@ -104,6 +3023,14 @@ class StudentManagementSystem(QMainWindow):
         restore_action.triggered.connect(self.restore_database)
         file_menu.addAction(restore_action)
         
+        snapshot_action = QAction("ایجاد نسخه خودکار اکنون", self)
+        snapshot_action.triggered.connect(self.create_snapshot)
+        file_menu.addAction(snapshot_action)
+        
+        restore_snapshot_action = QAction("بازیابی از نسخه‌های خودکار", self)
+        restore_snapshot_action.triggered.connect(self.restore_snapshot)
+        file_menu.addAction(restore_snapshot_action)
+        
         file_menu.addSeparator()
         
         exit_action = QAction("خروج", self)
@@ -132,14 +3059,44 @@ class StudentManagementSystem(QMainWindow):
         rank_action.triggered.connect(self.rank_students)
         tools_menu.addAction(rank_action)
         
+        self.rank_policy = "competition"
+        rank_policy_menu = tools_menu.addMenu("روش رتبه‌بندی")
+        rank_policy_menu.setLayoutDirection(Qt.RightToLeft)
+        rank_policy_group = QActionGroup(self)
+        for policy, (title, _) in RANK_POLICIES.items():
+            policy_action = QAction(title, self, checkable=True)
+            policy_action.setChecked(policy == self.rank_policy)
+            policy_action.triggered.connect(lambda checked, p=policy: self.set_rank_policy(p))
+            rank_policy_group.addAction(policy_action)
+            rank_policy_menu.addAction(policy_action)
+        
         chart_action = QAction("نمودار آماری", self)
         chart_action.triggered.connect(self.show_statistics_chart)
         tools_menu.addAction(chart_action)
         
+        analytics_action = QAction("تحلیل نمرات و ثبت‌نام", self)
+        analytics_action.triggered.connect(self.show_analytics)
+        tools_menu.addAction(analytics_action)
+        
         report_action = QAction("چاپ گزارش", self)
         report_action.triggered.connect(self.print_report)
         tools_menu.addAction(report_action)
         
+        transcripts_action = QAction("ایجاد کارنامه همه دانشجویان", self)
+        transcripts_action.triggered.connect(self.write_transcripts)
+        tools_menu.addAction(transcripts_action)
+        
+        tools_menu.addSeparator()
+        
+        query_debug_action = QAction("ثبت طرح اجرای پرس‌وجوها", self, checkable=True)
+        query_debug_action.setChecked(QUERY_DEBUG)
+        query_debug_action.toggled.connect(set_query_debug)
+        tools_menu.addAction(query_debug_action)
+        
+        diagnostics_action = QAction("گزارش عملکرد و پرس‌وجوهای کند", self)
+        diagnostics_action.triggered.connect(self.show_diagnostics)
+        tools_menu.addAction(diagnostics_action)
+        
         help_menu = menubar.addMenu("راهنما")
         help_menu.setLayoutDirection(Qt.RightToLeft)
         
@@ -277,29 +3234,57 @@ class StudentManagementSystem(QMainWindow):
         search_layout.addWidget(search_btn, 1, 4, 1, 1)
         
         reset_btn = QPushButton("↺ نمایش همه")
-        reset_btn.clicked.connect(self.load_students)
+        reset_btn.clicked.connect(self.reset_search)
         search_layout.addWidget(reset_btn, 1, 5, 1, 1)
         
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.advanced_search)
+        for search_edit in self.search_edits():
+            search_edit.textChanged.connect(lambda _: self.search_timer.start())
+        
         search_group.setLayout(search_layout)
         parent_layout.addWidget(search_group)
     
+    def search_edits(self):
+        return [self.search_name_edit, self.search_lastname_edit, self.search_id_edit,
+                self.search_min_avg_edit, self.search_max_avg_edit]
+    
+    def start_search_worker(self):
+        self.jobs = set()
+        self.search_generation = 0
+        self.search_sort = None
+        self.search_thread = QThread(self)
+        self.search_worker = SearchWorker(self.db)
+        self.search_worker.moveToThread(self.search_thread)
+        self.search_requested.connect(self.search_worker.search)
+        self.search_worker.search_finished.connect(self.show_search_results)
+        self.search_worker.search_failed.connect(self.show_search_error)
+        self.search_thread.start()
+    
+    def cancel_pending_search(self):
+        self.search_timer.stop()
+        self.search_generation += 1
+        self.search_worker.cancel_before(self.search_generation)
+    
     def create_student_table(self, parent_layout):
         table_group = QGroupBox("لیست دانشجویان")
         table_group.setLayoutDirection(Qt.RightToLeft)
         table_layout = QVBoxLayout()
         
-        self.student_table = QTableWidget()
-        self.student_table.setColumnCount(8)
-        self.student_table.setHorizontalHeaderLabels([
-            "ردیف", "نام", "نام خانوادگی", "شماره دانشجویی", 
-            "نمره میانترم", "نمره پایان‌ترم", "معدل", "رتبه"
-        ])
-        
+        self.student_model = StudentTableModel(self)
+        self.student_table = QTableView()
+        self.student_table.setModel(self.student_model)
+        self.student_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.student_table.setSelectionMode(QAbstractItemView.SingleSelection)
+
         self.student_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.student_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeToContents)
         self.student_table.horizontalHeader().setSectionResizeMode(3, QHeaderView.ResizeToContents)
         self.student_table.horizontalHeader().setSectionResizeMode(7, QHeaderView.ResizeToContents)
         self.student_table.setAlternatingRowColors(True)
+        self.student_table.horizontalHeader().setSortIndicator(0, Qt.AscendingOrder)
         self.student_table.setSortingEnabled(True)
         self.student_table.setLayoutDirection(Qt.RightToLeft)
         self.student_table.doubleClicked.connect(self.show_student_details)
@@ -310,34 +3295,15 @@ class StudentManagementSystem(QMainWindow):
     
     def create_database(self):
         try:
-            self.conn = sqlite3.connect('students.db')
+            self.db = ConnectionManager(DATABASE_PATH)
+            self.conn = self.db.writer
             self.cursor = self.conn.cursor()
+            self.rank_index = None
             
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS students (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    first_name TEXT NOT NULL,
-                    last_name TEXT NOT NULL,
-                    student_id TEXT UNIQUE NOT NULL,
-                    midterm REAL,
-                    final REAL,
-                    average REAL,
-                    rank INTEGER,
-                    registration_date TEXT,
-                    photo_path TEXT
-                )
-            ''')
-            
-            self.cursor.execute("PRAGMA table_info(students)")
-            columns = [column[1] for column in self.cursor.fetchall()]
-            
-            if 'registration_date' not in columns:
-                self.cursor.execute("ALTER TABLE students ADD COLUMN registration_date TEXT")
-            
-            if 'photo_path' not in columns:
-                self.cursor.execute("ALTER TABLE students ADD COLUMN photo_path TEXT")
-            
-            self.conn.commit()
+            self.full_text_search = ensure_schema(self.conn)
+            self.photo_store = PhotoStore()
+            self.reader = self.db.acquire_reader()
+            self.student_model.conn = self.reader
             
         except Exception as e:
             QMessageBox.critical(self, "خطا در پایگاه داده", f"خطا در ایجاد پایگاه داده: {str(e)}")
@@ -346,46 +3312,60 @@ class StudentManagementSystem(QMainWindow):
     def hash_password(self, password):
         return hashlib.sha256(password.encode()).hexdigest()
     
+    @measured("load_students")
     def load_students(self):
         try:
-            self.cursor.execute("SELECT * FROM students ORDER BY id")
-            students = self.cursor.fetchall()
-            
-            self.student_table.setRowCount(0)
+            self.cancel_pending_search()
+            if self.change_tracker.sync():
+                self.rank_index = None
+            self.student_model.set_filter("", [])
             
-            for row_idx, student in enumerate(students):
-                self.student_table.insertRow(row_idx)
-                cols_to_show = [0, 1, 2, 3, 4, 5, 6, 7]
-                
-                for table_col_idx, db_col_idx in enumerate(cols_to_show):
-                    data = student[db_col_idx] if db_col_idx < len(student) else None
-                    if data is None:
-                        data = "-"
-                    item = QTableWidgetItem(str(data))
-                    item.setTextAlignment(Qt.AlignCenter)
-                    self.student_table.setItem(row_idx, table_col_idx, item)
+            total_students = self.read_stats()[0]
             
             self.update_dashboard()
-            self.status_bar.showMessage(f"تعداد {len(students)} دانشجو بارگذاری شد")
+            self.status_bar.showMessage(f"تعداد {total_students} دانشجو بارگذاری شد")
         except Exception as e:
             QMessageBox.critical(self, "خطا", f"خطا در بارگذاری دانشجویان: {str(e)}")
 
+    def start_change_tracking(self):
+        self.change_tracker = ChangeTracker(self.reader, self.conn)
+        self.change_timer = QTimer(self)
+        self.change_timer.timeout.connect(self.poll_changes)
+        self.change_timer.start(CHANGE_POLL_MS)
+    
+    @measured("show_student_changes")
+    def show_student_changes(self, pks):
+        # ردیف‌های pks همراه با جابه‌جایی رتبه سایر دانشجویان بلافاصله از change_log خوانده می‌شوند؛ اعمال جداگانه آن‌ها همان ردیف‌ها را دو بار می‌خواند
+        self.poll_changes()
+    
+    @measured("poll_changes")
+    def poll_changes(self):
+        # تغییرات نمونه‌های دیگر برنامه (و کارهای پس‌زمینه) به جای بارگذاری کامل، ردیف به ردیف روی جدول اعمال می‌شوند
+        try:
+            result = self.change_tracker.poll()
+            if result is None:
+                return
+            external, pks, rank_ranges = result
+            if external:
+                self.rank_index = None
+            if pks is None:
+                self.student_model.reload()
+            else:
+                self.student_model.apply_changes(pks)
+                if rank_ranges:
+                    self.student_model.refresh_ranks(rank_ranges)
+            self.update_dashboard()
+            self.change_tracker.prune()
+        except sqlite3.Error as e:
+            self.status_bar.showMessage(f"خطا در دریافت تغییرات: {str(e)}")
+    
+    @measured("update_dashboard")
     def update_dashboard(self):
         try:
-            self.cursor.execute("SELECT COUNT(*) FROM students")
-            total_students = self.cursor.fetchone()[0]
-            
-            self.cursor.execute("SELECT AVG(average) FROM students WHERE average IS NOT NULL")
-            avg_result = self.cursor.fetchone()[0]
-            avg_grade = avg_result if avg_result else 0
-            
-            self.cursor.execute("SELECT MAX(average) FROM students WHERE average IS NOT NULL")
-            max_result = self.cursor.fetchone()[0]
+            total_students, graded_count, average_sum, max_result, excellent_count = self.read_stats()
+            avg_grade = average_sum / graded_count if graded_count else 0
             max_grade = max_result if max_result else 0
             
-            self.cursor.execute("SELECT COUNT(*) FROM students WHERE average >= 17")
-            excellent_count = self.cursor.fetchone()[0]
-            
             self.students_count_card.value_label.setText(str(total_students))
             self.avg_grade_card.value_label.setText(f"{avg_grade:.2f}")
             self.max_grade_card.value_label.setText(f"{max_grade:.2f}")
@@ -393,59 +3373,65 @@ class StudentManagementSystem(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "خطا", f"خطا در به‌روزرسانی داشبورد: {str(e)}")
 
+    def read_stats(self):
+        return self.reader.execute(
+            "SELECT student_count, graded_count, average_sum, max_average, excellent_count FROM student_stats WHERE id = 1"
+        ).fetchone()
+
     def advanced_search(self):
         try:
-            query = "SELECT * FROM students WHERE 1=1"
-            params = []
-            
-            if self.search_name_edit.text().strip():
-                query += " AND first_name LIKE ?"
-                params.append(f"%{self.search_name_edit.text().strip()}%")
-            
-            if self.search_lastname_edit.text().strip():
-                query += " AND last_name LIKE ?"
-                params.append(f"%{self.search_lastname_edit.text().strip()}%")
-            
-            if self.search_id_edit.text().strip():
-                query += " AND student_id LIKE ?"
-                params.append(f"%{self.search_id_edit.text().strip()}%")
-            
-            if self.search_min_avg_edit.text().strip():
-                try:
-                    min_avg = float(self.search_min_avg_edit.text())
-                    query += " AND average >= ?"
-                    params.append(min_avg)
-                except ValueError:
-                    pass
-            
-            if self.search_max_avg_edit.text().strip():
-                try:
-                    max_avg = float(self.search_max_avg_edit.text())
-                    query += " AND average <= ?"
-                    params.append(max_avg)
-                except ValueError:
-                    pass
-            
-            self.cursor.execute(query, params)
-            students = self.cursor.fetchall()
+            conditions, params = self.search_filter()
             
-            self.student_table.setRowCount(0)
-            
-            for row_idx, student in enumerate(students):
-                self.student_table.insertRow(row_idx)
-                cols_to_show = [0, 1, 2, 3, 4, 5, 6, 7]
-                for table_col_idx, db_col_idx in enumerate(cols_to_show):
-                    data = student[db_col_idx] if db_col_idx < len(student) else None
-                    if data is None:
-                        data = "-"
-                    item = QTableWidgetItem(str(data))
-                    item.setTextAlignment(Qt.AlignCenter)
-                    self.student_table.setItem(row_idx, table_col_idx, item)
-            
-            self.status_bar.showMessage(f"نتایج جستجو: {len(students)} دانشجو یافت شد")
+            self.cancel_pending_search()
+            self.search_sort = (self.student_model.sort_column, self.student_model.sort_order)
+            self.search_requested.emit(self.search_generation, conditions, params, *self.search_sort)
+            self.status_bar.showMessage("در حال جستجو...")
         except Exception as e:
             QMessageBox.critical(self, "خطا", f"خطا در جستجو: {str(e)}")
     
+    @measured("show_search_results")
+    def show_search_results(self, generation, conditions, params, rows, result_count):
+        if generation != self.search_generation:
+            return
+        if self.search_sort == (self.student_model.sort_column, self.student_model.sort_order):
+            self.student_model.apply_search_results(conditions, params, rows)
+        else:
+            self.student_model.set_filter(conditions, params)
+        self.status_bar.showMessage(f"نتایج جستجو: {result_count} دانشجو یافت شد")
+    
+    def show_search_error(self, generation, message):
+        if generation == self.search_generation:
+            QMessageBox.critical(self, "خطا", f"خطا در جستجو: {message}")
+    
+    @measured("reset_search")
+    def reset_search(self):
+        for search_edit in self.search_edits():
+            search_edit.blockSignals(True)
+            search_edit.clear()
+            search_edit.blockSignals(False)
+        self.load_students()
+    
+    def search_filter(self):
+        min_avg = None
+        max_avg = None
+        
+        if self.search_min_avg_edit.text().strip():
+            try:
+                min_avg = float(self.search_min_avg_edit.text())
+            except ValueError:
+                pass
+        
+        if self.search_max_avg_edit.text().strip():
+            try:
+                max_avg = float(self.search_max_avg_edit.text())
+            except ValueError:
+                pass
+        
+        return build_search_filter(
+            self.search_name_edit.text(), self.search_lastname_edit.text(), self.search_id_edit.text(),
+            min_avg, max_avg, self.full_text_search
+        )
+    
     def add_student_dialog(self):
         dialog = QDialog(self)
         dialog.setWindowTitle("افزودن دانشجوی جدید")
@@ -497,10 +3483,9 @@ class StudentManagementSystem(QMainWindow):
         final_edit.valueChanged.connect(auto_calc_average)
         
         photo_layout = QHBoxLayout()
-        self.photo_label = QLabel()
+        self.photo_label = PhotoLabel(self.thumbnails, 100, self.show_default_photo)
         self.photo_label.setFixedSize(100, 100)
         self.photo_label.setFrameShape(QFrame.Box)
-        self.photo_label.setAlignment(Qt.AlignCenter)
         self.show_default_photo()
         photo_layout.addWidget(self.photo_label)
         
@@ -532,22 +3517,28 @@ class StudentManagementSystem(QMainWindow):
                     QMessageBox.warning(self, "خطا", "لطفاً تمام فیلدهای ضروری را پر کنید")
                     return
                 
-                registration_date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                with instrumentation.measure("add_student"):
+                    registration_date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    photo_path = self.photo_store.add(self.conn, self.photo_path) if self.photo_path else self.photo_path
                 
-                self.cursor.execute(
-                    "INSERT INTO students (first_name, last_name, student_id, midterm, final, average, registration_date, photo_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-                    (first_name, last_name, student_id, midterm, final, average, registration_date, self.photo_path)
-                )
-                self.conn.commit()
+                    self.cursor.execute(
+                        "INSERT INTO students (first_name, last_name, student_id, midterm, final, average, registration_date, photo_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (first_name, last_name, student_id, midterm, final, average, registration_date, photo_path)
+                    )
+                    student_pk = self.cursor.lastrowid
+                    self.maintain_rank(student_pk, None, average)
+                    self.conn.commit()
                 
+                    self.student_events.students_changed.emit([student_pk])
                 QMessageBox.information(self, "موفقیت", "دانشجو با موفقیت اضافه شد")
-                self.load_students()
                 
             except ValueError:
                 QMessageBox.warning(self, "خطا", "لطفاً نمرات را به صورت عددی وارد کنید")
             except sqlite3.IntegrityError:
+                self.conn.rollback()
                 QMessageBox.warning(self, "خطا", "شماره دانشجویی تکراری است")
             except Exception as e:
+                self.discard_pending_changes()
                 QMessageBox.critical(self, "خطا", f"خطا در افزودن دانشجو: {str(e)}")
     
     def show_default_photo(self):
@@ -563,22 +3554,19 @@ class StudentManagementSystem(QMainWindow):
         file_path, _ = QFileDialog.getOpenFileName(self, "انتخاب عکس دانشجو", "", "Image files (*.jpg *.jpeg *.png *.bmp)")
         if file_path:
             try:
-                pixmap = QPixmap(file_path)
-                if not pixmap.isNull():
-                    pixmap = pixmap.scaled(100, 100, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-                    label.setPixmap(pixmap)
+                if QImageReader(file_path).canRead():
+                    label.set_photo(file_path)
                     self.photo_path = file_path
             except Exception as e:
                 QMessageBox.critical(self, "خطا", f"خطا در بارگذاری عکس: {str(e)}")
     
     def edit_student_dialog(self):
-        selected_items = self.student_table.selectedItems()
-        if not selected_items:
+        selected_student = self.selected_student()
+        if not selected_student:
             QMessageBox.warning(self, "هشدار", "لطفاً یک دانشجو را انتخاب کنید")
             return
         
-        row = selected_items[0].row()
-        student_id = self.student_table.item(row, 3).text()
+        student_id = selected_student[3]
         
         try:
             self.cursor.execute("SELECT * FROM students WHERE student_id=?", (student_id,))
@@ -644,20 +3632,13 @@ class StudentManagementSystem(QMainWindow):
             final_edit.valueChanged.connect(auto_calc_average_edit)
             
             photo_layout = QHBoxLayout()
-            self.photo_label = QLabel()
+            self.photo_label = PhotoLabel(self.thumbnails, 100, self.show_default_photo)
             self.photo_label.setFixedSize(100, 100)
             self.photo_label.setFrameShape(QFrame.Box)
-            self.photo_label.setAlignment(Qt.AlignCenter)
             
-            if len(student) > 9 and student[9]:
-                pixmap = QPixmap(student[9])
-                if not pixmap.isNull():
-                    pixmap = pixmap.scaled(100, 100, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-                    self.photo_label.setPixmap(pixmap)
-                    self.photo_path = student[9]
-                else:
-                    self.show_default_photo()
-                    self.photo_path = ""
+            if len(student) > 9 and student[9] and os.path.exists(student[9]):
+                self.photo_label.set_photo(student[9])
+                self.photo_path = student[9]
             else:
                 self.show_default_photo()
                 self.photo_path = ""
@@ -694,35 +3675,46 @@ class StudentManagementSystem(QMainWindow):
                         QMessageBox.warning(self, "خطا", "لطفاً تمام فیلدهای ضروری را پر کنید")
                         return
                     
-                    self.cursor.execute(
-                        "UPDATE students SET first_name=?, last_name=?, midterm=?, final=?, average=?, photo_path=? WHERE student_id=?",
-                        (first_name, last_name, midterm, final, average, self.photo_path, student_id)
-                    )
-                    self.conn.commit()
+                    with instrumentation.measure("edit_student"):
+                        photo_path = self.photo_store.add(self.conn, self.photo_path) if self.photo_path else self.photo_path
                     
+                        self.cursor.execute(
+                            "UPDATE students SET first_name=?, last_name=?, midterm=?, final=?, average=?, photo_path=? WHERE student_id=?",
+                            (first_name, last_name, midterm, final, average, photo_path, student_id)
+                        )
+                        self.maintain_rank(student[0], student[6], average)
+                        self.conn.commit()
+                        self.photo_store.collect_garbage(self.conn)
+                    
+                        self.student_events.students_changed.emit([student[0]])
                     QMessageBox.information(self, "موفقیت", "اطلاعات دانشجو با موفقیت به‌روزرسانی شد")
-                    self.load_students()
                     
                 except ValueError:
                     QMessageBox.warning(self, "خطا", "لطفاً نمرات را به صورت عددی وارد کنید")
                 except Exception as e:
+                    self.discard_pending_changes()
                     QMessageBox.critical(self, "خطا", f"خطا در ویرایش دانشجو: {str(e)}")
         except Exception as e:
             QMessageBox.critical(self, "خطا", f"خطا در ویرایش دانشجو: {str(e)}")
     
     def remove_photo(self, label):
-        self.show_default_photo()
+        label.set_photo("")
         self.photo_path = ""
     
+    def selected_student(self):
+        selected_rows = self.student_table.selectionModel().selectedRows()
+        if not selected_rows:
+            return None
+        return self.student_model.student_at(selected_rows[0].row())
+    
     def delete_student(self):
-        selected_items = self.student_table.selectedItems()
-        if not selected_items:
+        selected_student = self.selected_student()
+        if not selected_student:
             QMessageBox.warning(self, "هشدار", "لطفاً یک دانشجو را انتخاب کنید")
             return
         
-        row = selected_items[0].row()
-        student_id = self.student_table.item(row, 3).text()
-        student_name = f"{self.student_table.item(row, 1).text()} {self.student_table.item(row, 2).text()}"
+        student_id = selected_student[3]
+        student_name = f"{selected_student[1]} {selected_student[2]}"
         
         reply = QMessageBox.question(
             self, "تایید حذف", 
@@ -732,26 +3724,29 @@ class StudentManagementSystem(QMainWindow):
         
         if reply == QMessageBox.Yes:
             try:
-                self.cursor.execute("DELETE FROM students WHERE student_id=?", (student_id,))
-                self.conn.commit()
+                with instrumentation.measure("delete_student"):
+                    self.cursor.execute("SELECT id, average FROM students WHERE student_id=?", (student_id,))
+                    deleted_student = self.cursor.fetchone()
+                    self.cursor.execute("DELETE FROM students WHERE student_id=?", (student_id,))
+                    if deleted_student:
+                        self.maintain_rank(deleted_student[0], deleted_student[1], None)
+                    self.conn.commit()
+                    self.photo_store.collect_garbage(self.conn)
+                    if deleted_student:
+                        self.student_events.students_changed.emit([deleted_student[0]])
                 QMessageBox.information(self, "موفقیت", "دانشجو با موفقیت حذف شد")
-                self.load_students()
             except Exception as e:
+                self.discard_pending_changes()
                 QMessageBox.critical(self, "خطا", f"خطا در حذف دانشجو: {str(e)}")
     
     def rank_students(self):
         try:
-            self.cursor.execute("SELECT * FROM students WHERE average IS NOT NULL ORDER BY average DESC")
-            students = self.cursor.fetchall()
-            
-            if not students:
+            self.cursor.execute("SELECT 1 FROM students WHERE average IS NOT NULL LIMIT 1")
+            if self.cursor.fetchone() is None:
                 QMessageBox.information(self, "اطلاع", "هیچ دانشجویی با معدل معتبر یافت نشد")
                 return
             
-            for rank, student in enumerate(students, start=1):
-                student_id = student[3]
-                self.cursor.execute("UPDATE students SET rank=? WHERE student_id=?", (rank, student_id))
-            self.conn.commit()
+            self.rebuild_ranks()
             
             QMessageBox.information(self, "موفقیت", "رتبه‌بندی دانشجوها با موفقیت انجام شد")
             self.load_students()
@@ -759,9 +3754,40 @@ class StudentManagementSystem(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "خطا", f"خطا در رتبه‌بندی: {str(e)}")
     
+    def set_rank_policy(self, policy):
+        self.rank_policy = policy
+        try:
+            self.rebuild_ranks()
+            self.load_students()
+            self.status_bar.showMessage(f"روش رتبه‌بندی: {RANK_POLICIES[policy][0]}")
+        except Exception as e:
+            QMessageBox.critical(self, "خطا", f"خطا در رتبه‌بندی: {str(e)}")
+    
+    @measured("rebuild_ranks")
+    def rebuild_ranks(self):
+        rank_all_students(self.conn, self.rank_policy)
+        self.rank_index = RankIndex.build(self.conn, self.rank_policy)
+    
+    def maintain_rank(self, student_pk, old_average, new_average):
+        # نخستین تغییر، رتبه‌ها را یک بار کامل محاسبه می‌کند (و تغییر در حال انجام را هم ثبت می‌کند)؛ پس از آن فقط بازه متاثر به‌روز می‌شود
+        # اگر نویسنده دیگری از زمان ساخت فهرست چیزی نوشته باشد، فهرست دوباره ساخته می‌شود
+        if self.rank_index is None or not self.rank_index.is_current(self.conn):
+            self.rebuild_ranks()
+        else:
+            self.rank_index.apply(self.conn, student_pk, old_average, new_average)
+    
+    def discard_pending_changes(self):
+        self.rank_index = None
+        try:
+            self.conn.rollback()
+        except sqlite3.Error:
+            pass
+    
     def show_student_details(self, index):
-        row = index.row()
-        student_id = self.student_table.item(row, 3).text()
+        selected_student = self.student_model.student_at(index.row())
+        if not selected_student:
+            return
+        student_id = selected_student[3]
         
         try:
             self.cursor.execute("SELECT * FROM students WHERE student_id=?", (student_id,))
@@ -804,18 +3830,8 @@ class StudentManagementSystem(QMainWindow):
             photo_group.setLayoutDirection(Qt.RightToLeft)
             photo_layout = QVBoxLayout()
             
-            photo_label = QLabel()
-            photo_label.setAlignment(Qt.AlignCenter)
-            
-            if len(student) > 9 and student[9]:
-                pixmap = QPixmap(student[9])
-                if not pixmap.isNull():
-                    pixmap = pixmap.scaled(200, 200, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-                    photo_label.setPixmap(pixmap)
-                else:
-                    photo_label.setText("عکسی برای این دانشجو ثبت نشده است")
-            else:
-                photo_label.setText("عکسی برای این دانشجو ثبت نشده است")
+            photo_label = PhotoLabel(self.thumbnails, 200, lambda: photo_label.setText("عکسی برای این دانشجو ثبت نشده است"))
+            photo_label.set_photo(student[9] if len(student) > 9 else "")
             
             photo_layout.addWidget(photo_label)
             photo_group.setLayout(photo_layout)
@@ -832,146 +3848,87 @@ class StudentManagementSystem(QMainWindow):
     
     def export_to_excel(self):
         try:
-            self.cursor.execute("SELECT * FROM students ORDER BY id")
-            students = self.cursor.fetchall()
+            conditions, params = "", []
+            if self.student_model.conditions:
+                reply = QMessageBox.question(
+                    self, "محدوده خروجی", "آیا فقط نتایج جستجوی فعلی در خروجی قرار گیرد؟",
+                    QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes
+                )
+                if reply == QMessageBox.Yes:
+                    conditions, params = self.student_model.conditions, self.student_model.params
             
-            if not students:
+            exporter = StudentExporter(self.reader, conditions, params)
+            if not exporter.has_rows():
                 QMessageBox.information(self, "اطلاع", "هیچ دانشجویی برای خروجی وجود ندارد")
                 return
             
-            if students and len(students[0]) < 10:
-                self.create_database()
-                self.cursor.execute("SELECT * FROM students ORDER BY id")
-                students = self.cursor.fetchall()
-            
-            if len(students[0]) == 10:
-                df = pd.DataFrame(students, columns=[
-                    "ردیف", "نام", "نام خانوادگی", "شماره دانشجویی", 
-                    "نمره میانترم", "نمره پایان‌ترم", "معدل", "رتبه",
-                    "تاریخ ثبت", "مسیر عکس"
-                ])
-                df = df.drop(columns=["مسیر عکس"])
-            else:
-                df = pd.DataFrame(students, columns=[
-                    "ردیف", "نام", "نام خانوادگی", "شماره دانشجویی", 
-                    "نمره میانترم", "نمره پایان‌ترم", "معدل", "رتبه"
-                ])
-            
             timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
             file_path, _ = QFileDialog.getSaveFileName(
-                self, "ذخیره فایل اکسل", f"students_list_{timestamp}.xlsx", "Excel files (*.xlsx)"
+                self, "ذخیره فایل اکسل", f"students_list_{timestamp}.xlsx", "Excel files (*.xlsx);;CSV files (*.csv)"
             )
             
             if not file_path:
                 return
             
-            progress_dialog = QDialog(self)
-            progress_dialog.setWindowTitle("در حال ایجاد فایل اکسل")
-            progress_dialog.setMinimumWidth(300)
-            progress_dialog.setLayoutDirection(Qt.RightToLeft)
-            
-            layout = QVBoxLayout()
-            progress_label = QLabel("در حال ایجاد فایل اکسل...")
-            layout.addWidget(progress_label)
-            progress_bar = QProgressBar()
-            progress_bar.setRange(0, 0)
-            layout.addWidget(progress_bar)
-            progress_dialog.setLayout(layout)
-            progress_dialog.show()
-            
-            df.to_excel(file_path, index=False, engine='openpyxl')
-            progress_dialog.close()
-            
-            QMessageBox.information(self, "موفقیت", f"فایل اکسل با موفقیت ایجاد شد:\n{file_path}")
+            def export_finished(written):
+                QMessageBox.information(self, "موفقیت", f"فایل اکسل با موفقیت ایجاد شد:\n{file_path}")
+                
+                reply = QMessageBox.question(self, "باز کردن فایل", "آیا مایلید فایل اکسل باز شود؟", QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+                if reply == QMessageBox.Yes:
+                    os.startfile(file_path)
             
-            reply = QMessageBox.question(self, "باز کردن فایل", "آیا مایلید فایل اکسل باز شود؟", QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
-            if reply == QMessageBox.Yes:
-                os.startfile(file_path)
+            self.run_job(
+                Job(export_students_job, file_path, conditions, params, read_only=True),
+                "در حال ایجاد فایل اکسل", "در حال ایجاد فایل اکسل...", "ردیف",
+                export_finished, "خطا در ایجاد فایل اکسل"
+            )
         except Exception as e:
             QMessageBox.critical(self, "خطا", f"خطا در ایجاد فایل اکسل: {str(e)}")
     
     def import_from_excel(self):
-        file_path, _ = QFileDialog.getOpenFileName(self, "انتخاب فایل اکسل", "", "Excel files (*.xlsx)")
+        file_path, _ = QFileDialog.getOpenFileName(self, "انتخاب فایل اکسل", "", "Excel files (*.xlsx);;CSV files (*.csv)")
         if not file_path:
             return
         
-        try:
-            progress_dialog = QDialog(self)
-            progress_dialog.setWindowTitle("در حال وارد کردن داده‌ها")
-            progress_dialog.setMinimumWidth(300)
-            progress_dialog.setLayoutDirection(Qt.RightToLeft)
-            layout = QVBoxLayout()
-            progress_label = QLabel("در حال خواندن فایل اکسل...")
-            layout.addWidget(progress_label)
-            progress_bar = QProgressBar()
-            progress_bar.setRange(0, 0)
-            layout.addWidget(progress_bar)
-            progress_dialog.setLayout(layout)
-            progress_dialog.show()
-            
-            df = pd.read_excel(file_path)
-            
-            required_columns = ["نام", "نام خانوادگی", "شماره دانشجویی"]
-            for col in required_columns:
-                if col not in df.columns:
-                    progress_dialog.close()
-                    QMessageBox.critical(self, "خطا", f"ستون '{col}' در فایل اکسل یافت نشد")
-                    return
-            
-            success_count = 0
-            error_count = 0
-            errors = []
-            
-            self.create_database()
-            
-            for index, row in df.iterrows():
-                try:
-                    first_name = str(row["نام"]).strip()
-                    last_name = str(row["نام خانوادگی"]).strip()
-                    student_id = str(row["شماره دانشجویی"]).strip()
-                    
-                    if not first_name or not last_name or not student_id:
-                        errors.append(f"ردیف {index+1}: اطلاعات ناقص")
-                        error_count += 1
-                        continue
-                    
-                    midterm = None
-                    final = None
-                    
-                    if "نمره میانترم" in row and pd.notna(row["نمره میانترم"]):
-                        midterm = float(row["نمره میانترم"])
-                    if "نمره پایان‌ترم" in row and pd.notna(row["نمره پایان‌ترم"]):
-                        final = float(row["نمره پایان‌ترم"])
-                        
-                    average = None
-                    if midterm is not None and final is not None:
-                        average = (midterm * 0.3) + (final * 0.7)
-                    
-                    registration_date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    
-                    self.cursor.execute(
-                        "INSERT INTO students (first_name, last_name, student_id, midterm, final, average, registration_date) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                        (first_name, last_name, student_id, midterm, final, average, registration_date)
-                    )
-                    self.conn.commit()
-                    success_count += 1
-                except sqlite3.IntegrityError:
-                    errors.append(f"ردیف {index+1}: شماره دانشجویی تکراری")
-                    error_count += 1
-                except Exception as e:
-                    errors.append(f"ردیف {index+1}: خطا - {str(e)}")
-                    error_count += 1
-            
-            progress_dialog.close()
-            
-            result_msg = f"وارد کردن اطلاعات از اکسل تکمیل شد:\n\n✅ موفق: {success_count}\n❌ خطا: {error_count}\n"
+        def import_finished(importer):
+            result_msg = f"وارد کردن اطلاعات از اکسل تکمیل شد:\n\n✅ موفق: {importer.success_count}\n❌ خطا: {importer.error_count}\n"
+            errors = importer.error_messages()
             if errors:
                 result_msg += "\nخطاهای رخ داده:\n" + "\n".join(errors[:10])
             
+            self.rank_index = None
             QMessageBox.information(self, "نتیجه وارد کردن", result_msg)
             self.load_students()
-        except Exception as e:
-            QMessageBox.critical(self, "خطا", f"خطا در خواندن فایل اکسل: {str(e)}")
+        
+        def import_cancelled():
+            self.rank_index = None
+            self.load_students()
+            QMessageBox.information(self, "اطلاع", "وارد کردن اطلاعات لغو شد؛ دسته‌های ثبت‌شده تا این لحظه باقی می‌مانند")
+        
+        self.run_job(
+            Job(import_students_job, file_path, self.rank_policy),
+            "در حال وارد کردن داده‌ها", "در حال خواندن فایل اکسل...", "ردیف",
+            import_finished, "خطا در خواندن فایل اکسل", import_cancelled
+        )
+    
+    def import_photos(self):
+        folder = QFileDialog.getExistingDirectory(self, "انتخاب پوشه عکس‌ها (نام فایل = شماره دانشجویی)")
+        if not folder:
+            return
+        
+        def import_finished(importer):
+            result_msg = f"وارد کردن عکس‌ها تکمیل شد:\n\n✅ ثبت‌شده: {importer.updated_count}\n❓ بدون دانشجوی متناظر: {len(importer.unmatched)}\n❌ خطا: {len(importer.failed)}\n"
+            if importer.unmatched:
+                result_msg += "\nفایل‌های بدون دانشجوی متناظر:\n" + "\n".join(importer.unmatched[:10])
+            if importer.failed:
+                result_msg += "\nخطاهای رخ داده:\n" + "\n".join(importer.failed[:10])
+            QMessageBox.information(self, "نتیجه وارد کردن عکس‌ها", result_msg)
+        
+        self.run_job(
+            Job(import_photos_job, folder),
+            "در حال وارد کردن عکس‌ها", "در حال پردازش عکس‌ها...", "عکس",
+            import_finished, "خطا در وارد کردن عکس‌ها"
+        )
     
     def backup_database(self):
         try:
@@ -980,24 +3937,12 @@ class StudentManagementSystem(QMainWindow):
             if not file_path:
                 return
             
-            progress_dialog = QDialog(self)
-            progress_dialog.setWindowTitle("در حال پشتیبان‌گیری")
-            progress_dialog.setMinimumWidth(300)
-            progress_dialog.setLayoutDirection(Qt.RightToLeft)
-            layout = QVBoxLayout()
-            progress_label = QLabel("در حال پشتیبان‌گیری...")
-            layout.addWidget(progress_label)
-            progress_bar = QProgressBar()
-            progress_bar.setRange(0, 0)
-            layout.addWidget(progress_bar)
-            progress_dialog.setLayout(layout)
-            progress_dialog.show()
-            
-            with open('students.db', 'rb') as src, open(file_path, 'wb') as dst:
-                dst.write(src.read())
-            
-            progress_dialog.close()
-            QMessageBox.information(self, "موفقیت", f"پشتیبان‌گیری با موفقیت انجام شد:\n{file_path}")
+            self.run_job(
+                Job(backup_database_job, file_path, read_only=True),
+                "در حال پشتیبان‌گیری", "در حال پشتیبان‌گیری...", "صفحه",
+                lambda _: QMessageBox.information(self, "موفقیت", f"پشتیبان‌گیری با موفقیت انجام شد:\n{file_path}"),
+                "خطا در پشتیبان‌گیری"
+            )
         except Exception as e:
             QMessageBox.critical(self, "خطا", f"خطا در پشتیبان‌گیری: {str(e)}")
     
@@ -1010,47 +3955,137 @@ class StudentManagementSystem(QMainWindow):
         if reply == QMessageBox.No:
             return
         
-        try:
-            progress_dialog = QDialog(self)
-            progress_dialog.setWindowTitle("در حال بازیابی پشتیبان")
-            progress_dialog.setMinimumWidth(300)
-            progress_dialog.setLayoutDirection(Qt.RightToLeft)
-            layout = QVBoxLayout()
-            progress_label = QLabel("در حال بازیابی...")
-            layout.addWidget(progress_label)
-            progress_bar = QProgressBar()
-            progress_bar.setRange(0, 0)
-            layout.addWidget(progress_bar)
-            progress_dialog.setLayout(layout)
-            progress_dialog.show()
-            
-            self.conn.close()
-            with open(file_path, 'rb') as src, open('students.db', 'wb') as dst:
-                dst.write(src.read())
-            
-            self.conn = sqlite3.connect('students.db')
-            self.cursor = self.conn.cursor()
-            
-            progress_dialog.close()
+        def restore_finished(_):
+            self.rank_index = None
+            self.full_text_search = ensure_schema(self.conn)
+            self.maintain_photos()
             QMessageBox.information(self, "موفقیت", "بازیابی پشتیبان با موفقیت انجام شد")
             self.load_students()
+        
+        self.run_job(
+            Job(restore_database_job, file_path),
+            "در حال بازیابی پشتیبان", "در حال بازیابی...", "صفحه",
+            restore_finished, "خطا در بازیابی پشتیبان"
+        )
+    
+    def maintain_photos(self):
+        # انتقال عکس‌های با مسیر مطلق به مخزن و پاک‌سازی آن در پس‌زمینه و بدون پنجره پیشرفت انجام می‌شود
+        job = Job(maintain_photos_job)
+        
+        def finished(adopted):
+            self.jobs.discard(job)
+            if adopted:
+                self.status_bar.showMessage(f"{adopted} عکس به مخزن عکس‌ها منتقل شد")
+        
+        def failed(error):
+            self.jobs.discard(job)
+            self.status_bar.showMessage(f"خطا در نگهداری مخزن عکس‌ها: {error}")
+        
+        job.signals.finished.connect(finished)
+        job.signals.failed.connect(failed)
+        job.signals.cancelled.connect(lambda: self.jobs.discard(job))
+        self.jobs.add(job)
+        QThreadPool.globalInstance().start(job)
+    
+    def start_snapshot_scheduler(self):
+        self.snapshot_store = SnapshotStore(SNAPSHOT_DIR)
+        self.snapshot_job = None
+        self.snapshot_timer = QTimer(self)
+        self.snapshot_timer.timeout.connect(self.run_scheduled_snapshot)
+        self.snapshot_timer.start(SNAPSHOT_INTERVAL_MS)
+    
+    def run_scheduled_snapshot(self):
+        # نسخه زمان‌بندی‌شده بدون پنجره پیشرفت در پس‌زمینه ساخته می‌شود و نتیجه در نوار وضعیت نمایش داده می‌شود
+        if self.snapshot_job is not None:
+            return
+        job = Job(create_snapshot_job, self.snapshot_store, read_only=True)
+        
+        def done():
+            self.jobs.discard(job)
+            self.snapshot_job = None
+        
+        def finished(manifest):
+            done()
+            if manifest:
+                self.status_bar.showMessage(f"نسخه خودکار {manifest['created']} ایجاد شد")
+        
+        def failed(error):
+            done()
+            self.status_bar.showMessage(f"خطا در ایجاد نسخه خودکار: {error}")
+        
+        job.signals.finished.connect(finished)
+        job.signals.failed.connect(failed)
+        job.signals.cancelled.connect(done)
+        self.snapshot_job = job
+        self.jobs.add(job)
+        QThreadPool.globalInstance().start(job)
+    
+    def create_snapshot(self):
+        if self.snapshot_job is not None:
+            QMessageBox.information(self, "اطلاع", "ایجاد نسخه خودکار در حال انجام است")
+            return
+        
+        def snapshot_finished(manifest):
+            self.snapshot_job = None
+            if manifest:
+                QMessageBox.information(self, "موفقیت", f"نسخه {manifest['created']} ایجاد شد\nحجم ذخیره‌شده جدید: {manifest['stored_bytes'] / 1048576:.1f} مگابایت")
+            else:
+                QMessageBox.information(self, "اطلاع", "از آخرین نسخه تغییری ایجاد نشده است")
+        
+        def snapshot_stopped():
+            self.snapshot_job = None
+            self.status_bar.showMessage("عملیات لغو شد")
+        
+        self.snapshot_job = Job(create_snapshot_job, self.snapshot_store, read_only=True)
+        self.run_job(
+            self.snapshot_job,
+            "در حال ایجاد نسخه", "در حال ایجاد نسخه خودکار...", "صفحه",
+            snapshot_finished, "خطا در ایجاد نسخه خودکار",
+            on_cancelled=snapshot_stopped, on_failed=snapshot_stopped
+        )
+    
+    def restore_snapshot(self):
+        try:
+            snapshots = self.snapshot_store.snapshots()
         except Exception as e:
-            QMessageBox.critical(self, "خطا", f"خطا در بازیابی پشتیبان: {str(e)}")
-            try:
-                self.conn = sqlite3.connect('students.db')
-                self.cursor = self.conn.cursor()
-            except:
-                pass
+            QMessageBox.critical(self, "خطا", f"خطا در خواندن نسخه‌ها: {str(e)}")
+            return
+        if not snapshots:
+            QMessageBox.information(self, "اطلاع", "هیچ نسخه خودکاری وجود ندارد")
+            return
+        
+        dialog = SnapshotDialog(self, snapshots)
+        if dialog.exec_() != QDialog.Accepted or not dialog.selected_name():
+            return
+        name = dialog.selected_name()
+        
+        reply = QMessageBox.question(self, "تایید بازیابی", "آیا از بازیابی این نسخه اطمینان دارید؟\nتمامی داده‌های فعلی جایگزین خواهند شد.", QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if reply == QMessageBox.No:
+            return
+        
+        def restore_finished(_):
+            self.rank_index = None
+            self.full_text_search = ensure_schema(self.conn)
+            self.maintain_photos()
+            QMessageBox.information(self, "موفقیت", "بازیابی نسخه با موفقیت انجام شد")
+            self.load_students()
+        
+        self.run_job(
+            Job(restore_snapshot_job, self.snapshot_store, name),
+            "در حال بازیابی نسخه", "در حال بازسازی و بازیابی نسخه...", "صفحه",
+            restore_finished, "خطا در بازیابی نسخه"
+        )
     
     def show_statistics_chart(self):
         try:
-            self.cursor.execute("SELECT average FROM students WHERE average IS NOT NULL")
-            averages = [row[0] for row in self.cursor.fetchall()]
+            counts = tuple(row[0] for row in self.reader.execute("SELECT student_count FROM average_histogram ORDER BY bin"))
             
-            if not averages:
+            if not any(counts):
                 QMessageBox.information(self, "اطلاع", "هیچ داده‌ای برای نمایش نمودار وجود ندارد")
                 return
             
+            pixmap = self.figures.get_or_render(("histogram", counts), render_histogram, counts)
+            
             dialog = QDialog(self)
             dialog.setWindowTitle("نمودار آماری معدل دانشجویان")
             dialog.setMinimumSize(800, 600)
@@ -1058,16 +4093,10 @@ class StudentManagementSystem(QMainWindow):
             
             layout = QVBoxLayout()
             
-            figure = Figure(figsize=(10, 6), dpi=100)
-            canvas = FigureCanvas(figure)
-            layout.addWidget(canvas)
-            
-            ax = figure.add_subplot(111)
-            ax.hist(averages, bins=20, color='#3498db', edgecolor='black', alpha=0.7)
-            ax.set_title('توزیع معدل دانشجویان', fontname='B Nazanin', fontsize=16)
-            ax.set_xlabel('معدل', fontname='B Nazanin', fontsize=12)
-            ax.set_ylabel('تعداد دانشجویان', fontname='B Nazanin', fontsize=12)
-            ax.grid(True, linestyle='--', alpha=0.7)
+            chart_label = QLabel()
+            chart_label.setAlignment(Qt.AlignCenter)
+            chart_label.setPixmap(pixmap)
+            layout.addWidget(chart_label)
             
             close_btn = QPushButton("بستن")
             close_btn.clicked.connect(dialog.accept)
@@ -1078,68 +4107,155 @@ class StudentManagementSystem(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "خطا", f"خطا در نمایش نمودار: {str(e)}")
     
-    def print_report(self):
+    def data_version(self):
+        return self.reader.execute(
+            "SELECT (SELECT MAX(seq) FROM change_log), (SELECT student_count FROM student_stats WHERE id = 1)"
+        ).fetchone()
+    
+    def show_analytics(self):
         try:
-            self.cursor.execute("SELECT * FROM students ORDER BY id")
-            students = self.cursor.fetchall()
+            version = self.data_version()
+            dialog = QDialog(self)
+            dialog.setWindowTitle("تحلیل نمرات و ثبت‌نام")
+            dialog.setMinimumSize(850, 700)
+            dialog.setLayoutDirection(Qt.RightToLeft)
             
-            if not students:
+            layout = QVBoxLayout()
+            tabs = QTabWidget()
+            labels = {}
+            for name, title in ANALYTICS_CHARTS:
+                label = QLabel()
+                label.setAlignment(Qt.AlignCenter)
+                pixmap = self.figures.get(("analytics", name, version))
+                if pixmap is not None:
+                    label.setPixmap(pixmap)
+                else:
+                    label.setText("در حال محاسبه...")
+                labels[name] = label
+                tabs.addTab(label, title)
+            layout.addWidget(tabs)
+            
+            close_btn = QPushButton("بستن")
+            close_btn.clicked.connect(dialog.accept)
+            layout.addWidget(close_btn)
+            dialog.setLayout(layout)
+            
+            # نمودارها در پس‌زمینه محاسبه و رسم می‌شوند و پنجره بلافاصله باز می‌شود
+            if any(self.figures.get(("analytics", name, version)) is None for name, _ in ANALYTICS_CHARTS):
+                job = Job(build_analytics_job, read_only=True)
+                
+                def analytics_finished(images):
+                    self.jobs.discard(job)
+                    for name, image in images.items():
+                        pixmap = self.figures.put(("analytics", name, version), image)
+                        if dialog.isVisible():
+                            labels[name].setPixmap(pixmap)
+                
+                def analytics_failed(error):
+                    self.jobs.discard(job)
+                    if dialog.isVisible():
+                        for label in labels.values():
+                            label.setText(f"خطا در محاسبه نمودار: {error}")
+                
+                job.signals.finished.connect(analytics_finished)
+                job.signals.failed.connect(analytics_failed)
+                job.signals.cancelled.connect(lambda: self.jobs.discard(job))
+                dialog.finished.connect(lambda _: job.cancel())
+                self.jobs.add(job)
+                QThreadPool.globalInstance().start(job)
+            
+            dialog.exec_()
+        except Exception as e:
+            QMessageBox.critical(self, "خطا", f"خطا در نمایش تحلیل‌ها: {str(e)}")
+    
+    def print_report(self):
+        try:
+            if not self.read_stats()[0]:
                 QMessageBox.information(self, "اطلاع", "هیچ دانشجویی برای چاپ وجود ندارد")
                 return
             
             timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            file_path, _ = QFileDialog.getSaveFileName(self, "ذخیره گزارش", f"students_report_{timestamp}.txt", "Text files (*.txt)")
+            file_path, _ = QFileDialog.getSaveFileName(
+                self, "ذخیره گزارش", f"students_report_{timestamp}.txt",
+                "Text files (*.txt);;HTML files (*.html);;PDF files (*.pdf)"
+            )
             if not file_path:
                 return
             
-            progress_dialog = QDialog(self)
-            progress_dialog.setWindowTitle("در حال ایجاد گزارش")
-            progress_dialog.setMinimumWidth(300)
-            progress_dialog.setLayoutDirection(Qt.RightToLeft)
-            layout = QVBoxLayout()
-            progress_label = QLabel("در حال ایجاد گزارش...")
-            layout.addWidget(progress_label)
-            progress_bar = QProgressBar()
-            progress_bar.setRange(0, 0)
-            layout.addWidget(progress_bar)
-            progress_dialog.setLayout(layout)
-            progress_dialog.show()
-            
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write("="*50 + "\n")
-                f.write("گزارش دانشجویان".center(50) + "\n")
-                f.write("="*50 + "\n\n")
-                f.write(f"تاریخ گزارش: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-                f.write(f"{'ردیف':<5}{'نام':<15}{'نام خانوادگی':<20}{'شماره دانشجویی':<15}{'میانترم':<10}{'پایان‌ترم':<10}{'معدل':<10}{'رتبه':<10}\n")
-                f.write("-"*95 + "\n")
-                
-                for student in students:
-                    f.write(f"{student[0]:<5}{student[1]:<15}{student[2]:<20}{student[3]:<15}{str(student[4]) if student[4] is not None else '-':<10}{str(student[5]) if student[5] is not None else '-':<10}{str(student[6]) if student[6] is not None else '-':<10}{str(student[7]) if student[7] is not None else '-':<10}\n")
-                
-                f.write("\n" + "="*50 + "\n")
-                f.write("آمار پایانی".center(50) + "\n")
-                f.write("="*50 + "\n\n")
-                
-                total_students = len(students)
-                avg_list = [s[6] for s in students if s[6] is not None]
-                avg_grade = sum(avg_list) / len(avg_list) if avg_list else 0
-                max_grade = max(avg_list) if avg_list else 0
-                excellent_count = len([s for s in students if s[6] is not None and s[6] >= 17])
+            def report_finished(_):
+                QMessageBox.information(self, "موفقیت", f"گزارش با موفقیت ایجاد شد:\n{file_path}")
                 
-                f.write(f"تعداد کل دانشجویان: {total_students}\n")
-                f.write(f"میانگین معدل: {avg_grade:.2f}\n")
-                f.write(f"بالاترین معدل: {max_grade:.2f}\n")
-                f.write(f"تعداد دانشجویان ممتاز: {excellent_count}\n")
+                reply = QMessageBox.question(self, "باز کردن فایل", "آیا مایلید فایل گزارش باز شود؟", QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+                if reply == QMessageBox.Yes:
+                    os.startfile(file_path)
             
-            progress_dialog.close()
-            QMessageBox.information(self, "موفقیت", f"گزارش با موفقیت ایجاد شد:\n{file_path}")
-            
-            reply = QMessageBox.question(self, "باز کردن فایل", "آیا مایلید فایل گزارش باز شود؟", QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
-            if reply == QMessageBox.Yes:
-                os.startfile(file_path)
+            self.run_job(
+                Job(write_report_job, file_path, read_only=True),
+                "در حال ایجاد گزارش", "در حال ایجاد گزارش...", "ردیف",
+                report_finished, "خطا در ایجاد گزارش"
+            )
         except Exception as e:
             QMessageBox.critical(self, "خطا", f"خطا در ایجاد گزارش: {str(e)}")
     
+    def write_transcripts(self):
+        if not self.read_stats()[0]:
+            QMessageBox.information(self, "اطلاع", "هیچ دانشجویی برای ایجاد کارنامه وجود ندارد")
+            return
+        
+        folder = QFileDialog.getExistingDirectory(self, "انتخاب پوشه کارنامه‌ها (کارنامه‌های موجود دوباره ساخته نمی‌شوند)")
+        if not folder:
+            return
+        
+        def transcripts_finished(writer):
+            result_msg = f"ایجاد کارنامه‌ها تکمیل شد:\n\n✅ ایجادشده: {writer.written_count}\n⏭ بدون تغییر: {writer.skipped_count}\n❌ خطا: {len(writer.failed)}\n"
+            if writer.failed:
+                result_msg += "\nخطاهای رخ داده:\n" + "\n".join(writer.failed[:10])
+            QMessageBox.information(self, "نتیجه ایجاد کارنامه‌ها", result_msg)
+        
+        self.run_job(
+            Job(write_transcripts_job, folder, read_only=True),
+            "در حال ایجاد کارنامه‌ها", "در حال ایجاد کارنامه‌ها...", "کارنامه",
+            transcripts_finished, "خطا در ایجاد کارنامه‌ها"
+        )
+    
+    def show_diagnostics(self):
+        DiagnosticsDialog(self).exec_()
+    
+    def run_job(self, job, title, message, unit, on_finished, error_title, on_cancelled=None, on_failed=None):
+        dialog = JobProgressDialog(self, title, message, unit)
+        job.signals.progress.connect(dialog.update_progress)
+        dialog.cancel_button.clicked.connect(job.cancel)
+        dialog.cancel_button.clicked.connect(lambda: dialog.cancel_button.setEnabled(False))
+        
+        def done():
+            self.jobs.discard(job)
+            dialog.hide()
+            dialog.deleteLater()
+        
+        def finished(result):
+            done()
+            on_finished(result)
+        
+        def failed(error):
+            done()
+            QMessageBox.critical(self, "خطا", f"{error_title}: {error}")
+            if on_failed:
+                on_failed()
+        
+        def cancelled():
+            done()
+            if on_cancelled:
+                on_cancelled()
+            else:
+                self.status_bar.showMessage("عملیات لغو شد")
+        
+        job.signals.finished.connect(finished)
+        job.signals.failed.connect(failed)
+        job.signals.cancelled.connect(cancelled)
+        self.jobs.add(job)
+        dialog.show()
+        QThreadPool.globalInstance().start(job)
+    
     def show_about(self):
         about_text = """
         <h2>مدیریت دانشجویان</h2>
@@ -1159,13 +4275,31 @@ class StudentManagementSystem(QMainWindow):
     
     def closeEvent(self, event):
         try:
-            if hasattr(self, 'conn') and self.conn:
-                self.conn.close()
+            self.cancel_pending_search()
+            self.search_thread.quit()
+            self.search_thread.wait()
+            self.search_worker.close()
+        except:
+            pass
+        try:
+            self.snapshot_timer.stop()
+            for job in list(self.jobs):
+                job.cancel()
+            QThreadPool.globalInstance().waitForDone()
+        except:
+            pass
+        try:
+            if hasattr(self, 'db'):
+                self.db.release_reader(self.reader)
+                self.db.close()
         except:
             pass
         event.accept()
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    
     app = QApplication(sys.argv)
     app.setStyle('Fusion')
     app.setLayoutDirection(Qt.RightToLeft)